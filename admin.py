@@ -3,22 +3,23 @@ import asyncio
 import getpass
 import hashlib
 from db import create_admin, get_admin, get_connection
+from generator import GENERATORS, from_legacy_index
 
 async def delete_admin(username: str) -> bool:
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute("DELETE FROM scraper_admin WHERE username=%s", (username,))
             return cur.rowcount > 0
 
 async def list_admins():
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute("SELECT username FROM scraper_admin;")
             return [row["username"] for row in await cur.fetchall()]
 
 async def reset_password(username: str, new_password: str) -> bool:
     new_hash = hashlib.sha256(new_password.encode()).hexdigest()
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(
                 "UPDATE scraper_admin SET password_hash=%s WHERE username=%s",
@@ -26,6 +27,32 @@ async def reset_password(username: str, new_password: str) -> bool:
             )
             return cur.rowcount > 0
 
+async def convert_cursors():
+    """
+    Rewrite lastcount cursors of the old per-length form as keyspace
+    positions. Runs once per database: the 'keyspace_cursors' flag in
+    statefull records it, and None is returned when it is already set.
+    """
+    async with get_connection("admin") as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                INSERT INTO statefull (state_type, state, value) VALUES ('keyspace_cursors', true, NULL)
+                ON CONFLICT DO NOTHING;
+            """)
+            if cur.rowcount == 0:
+                return None
+            await cur.execute("SELECT service, last_index FROM lastcount FOR UPDATE;")
+            converted = {}
+            for row in await cur.fetchall():
+                if row["service"] not in GENERATORS:
+                    continue
+                position = from_legacy_index(row["service"], row["last_index"])
+                await cur.execute(
+                    "UPDATE lastcount SET last_index = %s WHERE service = %s;", (position, row["service"])
+                )
+                converted[row["service"]] = (row["last_index"], position)
+            return converted
+
 async def main():
     while True:
         print("\n=== Scraper Admin CLI ===")
@@ -34,8 +61,9 @@ async def main():
         print("3. Delete admin")
         print("4. List admins")
         print("5. Reset password")
-        print("6. Exit")
-        choice = input("Select an option (1-6): ").strip()
+        print("6. Convert generator cursors (once, when upgrading)")
+        print("7. Exit")
+        choice = input("Select an option (1-7): ").strip()
 
         if choice == "1":
             username = input("Enter username: ").strip()
@@ -85,6 +113,18 @@ async def main():
                 print(f"\nNo admin found with username '{username}'")
 
         elif choice == "6":
+            confirm = input("Stop every server process first. Convert lastcount now? (yes/no): ").strip().lower()
+            if confirm == "yes":
+                converted = await convert_cursors()
+                if converted is None:
+                    print("\nCursors were already converted.")
+                else:
+                    for service, (old, new) in converted.items():
+                        print(f" - {service}: {old} -> {new}")
+            else:
+                print("Conversion cancelled.")
+
+        elif choice == "7":
             print("Exiting...")
             break
 
@@ -0,0 +1,119 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from fastapi import Request
+from fastapi.responses import Response
+
+# Dashboard assets, built once at startup. Every file in static/ is kept in
+# memory, precompressed, and also served under a fingerprinted name
+# (index.3f9c1a2b7d.js) with a year-long immutable Cache-Control; templates
+# link to that name through asset_url(). Plain names still work but must be
+# revalidated. The dashboard and login pages have no per-request content, so
+# they are rendered once as well and answered with 304 when unchanged.
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+STATIC_DIR = "static"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+PAGE_CACHE = "private, no-cache"  # one URL serves the login or the dashboard page
+
+
+class Asset:
+    __slots__ = ("body", "gzip", "br", "media_type", "etag")
+
+    def __init__(self, body, media_type):
+        self.body = body
+        self.media_type = media_type
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        self.gzip = gzip.compress(body, 9, mtime=0)
+        self.br = brotli.compress(body) if brotli is not None else None
+
+
+ASSETS: dict[str, tuple[Asset, str]] = {}  # served name -> (asset, Cache-Control)
+MANIFEST: dict[str, str] = {}  # file name -> fingerprinted name
+PAGES: dict[str, Asset] = {}
+
+
+def build_static(directory=STATIC_DIR):
+    ASSETS.clear()
+    MANIFEST.clear()
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            body = f.read()
+        asset = Asset(body, mimetypes.guess_type(name)[0] or "application/octet-stream")
+        stem, ext = os.path.splitext(name)
+        fingerprinted = f"{stem}.{asset.etag[1:11]}{ext}"
+        MANIFEST[name] = fingerprinted
+        ASSETS[name] = (asset, REVALIDATE)
+        ASSETS[fingerprinted] = (asset, IMMUTABLE)
+    log.info("%d static files fingerprinted", len(MANIFEST))
+
+def asset_url(name):
+    return f"/static/{MANIFEST.get(name, name)}"
+
+def build_pages(templates, names):
+    """Render templates that take no per-request data, once."""
+    templates.env.globals["asset_url"] = asset_url
+    for name in names:
+        PAGES[name] = Asset(templates.get_template(name).render().encode(), "text/html; charset=utf-8")
+
+def _accepted_encodings(header):
+    """Codings the client accepts (q > 0), from an Accept-Encoding header."""
+    accepted, refused = set(), set()
+    for item in header.lower().split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        (accepted if q > 0 else refused).add(coding)
+    if "*" in accepted:
+        accepted |= {"br", "gzip"} - refused
+    return accepted
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    tags = {tag.strip() for tag in header.split(",")}
+    # Weak comparison, as If-None-Match asks for
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def asset_response(request: Request, asset: Asset, cache_control):
+    # Each encoding is its own representation, so its own ETag
+    accept = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    if asset.br is not None and "br" in accept:
+        body, encoding = asset.br, "br"
+    elif "gzip" in accept:
+        body, encoding = asset.gzip, "gzip"
+    else:
+        body, encoding = asset.body, None
+    etag = f'{asset.etag[:-1]}-{encoding}"' if encoding else asset.etag
+
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=asset.media_type, headers=headers)
+
+def static_response(request: Request, name):
+    entry = ASSETS.get(name)
+    if entry is None:
+        return Response("Not Found", status_code=404, media_type="text/plain")
+    return asset_response(request, *entry)
+
+def page_response(request: Request, name):
+    return asset_response(request, PAGES[name], PAGE_CACHE)
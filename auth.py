@@ -1,5 +1,17 @@
 import hashlib
+import os
+import time
 from db import *
+from cluster import publish
+
+# Admin sessions that passed check_session, keyed by (key1, key2, key3),
+# are trusted for SESSION_CACHE_TTL seconds without asking the DB again.
+# Logout, login and "revoke all" drop them here and, over NOTIFY, in every
+# other server process. Each drop bumps _generation; a DB check that was
+# in flight across a drop does not cache its (possibly stale) answer.
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))
+SESSIONS: dict[tuple, float] = {}
+_generation = 0
 
 def integrity_check(cookies) -> bool:
     required_keys = ["keyone", "keytwo", "keythree", "keyhash"]
@@ -15,10 +27,35 @@ def integrity_check(cookies) -> bool:
         False
 
 async def check_session(key1, key2, key3):
-    if await is_logged_in_logic((key1, key2, key3)):
+    keys = (key1, key2, key3)
+    now = time.monotonic()
+    if SESSIONS.get(keys, 0) > now:
+        return True
+    generation = _generation
+    if await is_logged_in_logic(keys):
+        if generation != _generation:
+            return True
+        for cached in [k for k, expires in SESSIONS.items() if expires <= now]:
+            del SESSIONS[cached]
+        SESSIONS[keys] = now + SESSION_CACHE_TTL
         return True
     else:
+        SESSIONS.pop(keys, None)
         return False
 
+async def drop_sessions(key1=None):
+    """Forget cached sessions with this key1, or all of them."""
+    global _generation
+    _generation += 1
+    if key1 is None:
+        SESSIONS.clear()
+    else:
+        for keys in [k for k in SESSIONS if k[0] == key1]:
+            del SESSIONS[keys]
+
+async def invalidate_sessions(key1=None):
+    await drop_sessions(key1)
+    await publish("sessions", key1)
+
 def hash(text):
     return hashlib.sha256(text.encode()).hexdigest()
\ No newline at end of file
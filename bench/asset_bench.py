@@ -0,0 +1,114 @@
+"""
+Dashboard page load: bytes on the wire and server time per request.
+
+Drives the app in-process (no database; the session check is replaced by a
+stub that accepts the cookie) and compares, for a first visit and a repeat
+visit, plus the time to build the dashboard page response alone:
+  before  Jinja render per request, static/ through StaticFiles, no gzip
+  after   pages rendered once, fingerprinted precompressed assets, 304s
+
+    python bench/asset_bench.py --requests 200
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.testclient import TestClient
+from jinja2 import Environment, FileSystemLoader
+
+import assets
+import main as server
+
+SCRIPTS = ["index.js", "control.js", "fetch.js"]
+COOKIES = {"keyone": "a", "keytwo": "b", "keythree": "c", "keyhash": hashlib.sha256(b"abc").hexdigest()}
+
+
+def before_app():
+    """The previous setup: StaticFiles mount and a template render per visit."""
+    app = FastAPI()
+    app.mount("/static", StaticFiles(directory="static"), name="static")
+    env = Environment(loader=FileSystemLoader("templates"))
+    env.globals["asset_url"] = lambda name: f"/static/{name}"
+
+    @app.get("/")
+    async def dashboard(request: Request):
+        return HTMLResponse(env.get_template("index.html").render(request=request))
+
+    return app
+
+
+def visit(client, urls, etags):
+    sent = 0
+    for url in urls:
+        headers = {"accept-encoding": "gzip, br"}
+        if url in etags:
+            headers["if-none-match"] = etags[url]
+        r = client.get(url, headers=headers)
+        sent += int(r.headers.get("content-length") or len(r.content))
+        if "etag" in r.headers:
+            etags[url] = r.headers["etag"]
+    return sent
+
+
+def measure(client, urls, count):
+    etags = {}
+    first = visit(client, urls, etags)
+    started = time.perf_counter()
+    for _ in range(count):
+        repeat = visit(client, urls, etags)
+    return {
+        "first_visit_bytes": first,
+        "repeat_visit_bytes": repeat,
+        "ms_per_visit": round((time.perf_counter() - started) / count * 1000, 3),
+    }
+
+
+def page_us(fn, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return round((time.perf_counter() - started) / count * 1e6, 1)
+
+
+async def accept_session(key1, key2, key3):
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    server.check_session = accept_session
+    assets.build_static()
+    assets.build_pages(server.templates, ("index.html", "login.html"))
+
+    env = Environment(loader=FileSystemLoader("templates"))
+    env.globals["asset_url"] = assets.asset_url
+    request = server.Request({"type": "http", "headers": [(b"accept-encoding", b"gzip")]})
+    render_us = {
+        "before": page_us(lambda: HTMLResponse(env.get_template("index.html").render(request=request)), args.requests),
+        "after": page_us(lambda: assets.page_response(request, "index.html"), args.requests),
+    }
+
+    before = TestClient(before_app(), cookies=COOKIES)
+    after = TestClient(server.app, cookies=COOKIES)
+    print(json.dumps({
+        "brotli_installed": assets.brotli is not None,
+        "page_response_us": render_us,
+        "before": measure(before, ["/"] + [f"/static/{name}" for name in SCRIPTS], args.requests),
+        "after": measure(after, ["/"] + [assets.asset_url(name) for name in SCRIPTS], args.requests),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
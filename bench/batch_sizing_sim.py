@@ -0,0 +1,140 @@
+"""
+Simulated fleet comparing fixed /tasks batches with worker-aware sizing
+(scheduler.batch_size_for). No server or DB is involved: fake workers with
+different speeds pull batches, process them, report completions and heartbeats,
+and occasionally die, stranding whatever they still hold.
+
+    python bench/batch_sizing_sim.py [--workers 40] [--hours 6] [--seed 1]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inflight
+import scheduler
+
+POLL_LATENCY = 3        # seconds a worker idles per /tasks round trip
+STALE_AFTER = 3600      # big_queue reclaim cutoff used by unresolved_retrieve
+MEAN_LIFETIME = 4 * 3600
+RESTART_AFTER = 30
+HEARTBEAT_EVERY = 5
+
+# (share of fleet, URLs/sec, reported cpu %)
+PROFILES = [
+    (0.25, 6.0, 40),
+    (0.45, 1.5, 60),
+    (0.20, 0.4, 85),
+    (0.10, 0.03, 97),
+]
+
+
+class FakeWorker:
+    def __init__(self, ident, rate, cpu):
+        self.ident = ident
+        self.rate = rate
+        self.cpu = cpu
+        self.generation = 0
+        self.tasks = []          # issue timestamps of held URLs
+        self.progress = 0.0
+        self.busy_until = 0      # polling or restarting
+        self.alive = True
+
+    @property
+    def worker_id(self):
+        return f"{self.ident}-{self.generation}"
+
+
+def simulate(mode, n_workers, seconds, seed):
+    rng = random.Random(seed)
+    scheduler.WORKER_LOAD.clear()
+    scheduler.WORKERS.clear()
+    inflight.LEDGER.clear()
+
+    workers = []
+    for i in range(n_workers):
+        pick = rng.random()
+        for share, rate, cpu in PROFILES:
+            if pick < share:
+                break
+            pick -= share
+        workers.append(FakeWorker(i, rate * rng.uniform(0.8, 1.2), cpu))
+        scheduler.WORKERS[workers[-1].worker_id] = "key"
+
+    issued = on_time = late = lost = polls = 0
+    for now in range(seconds):
+        for w in workers:
+            if not w.alive:
+                if now >= w.busy_until:
+                    w.alive = True
+                    w.generation += 1
+                    scheduler.WORKERS[w.worker_id] = "key"  # registers again after a restart
+                continue
+
+            if rng.random() < 1 / MEAN_LIFETIME:
+                lost += len(w.tasks)
+                scheduler.forget_worker(w.worker_id)
+                w.tasks.clear()
+                w.progress = 0.0
+                w.alive = False
+                w.busy_until = now + RESTART_AFTER
+                continue
+
+            if now % HEARTBEAT_EVERY == 0:
+                scheduler.record_worker_usage(w.worker_id, w.cpu, 50, now=now)
+
+            if now < w.busy_until:
+                continue
+
+            if not w.tasks:
+                size = scheduler.BATCH_SIZE if mode == "fixed" else scheduler.batch_size_for(w.worker_id, now=now)
+                scheduler.record_issued(w.worker_id, size, now=now)
+                w.tasks = [now + POLL_LATENCY] * size
+                w.busy_until = now + POLL_LATENCY
+                issued += size
+                polls += 1
+                continue
+
+            w.progress += w.rate
+            done = min(int(w.progress), len(w.tasks))
+            if done:
+                w.progress -= done
+                for issued_at in w.tasks[:done]:
+                    if now - issued_at > STALE_AFTER:
+                        late += 1
+                    else:
+                        on_time += 1
+                del w.tasks[:done]
+                scheduler.record_completion(w.worker_id, done, now=now)
+
+    stranded = sum(len(w.tasks) for w in workers)
+    return {
+        "mode": mode,
+        "issued": issued,
+        "polls": polls,
+        "completed_on_time": on_time,
+        "throughput_per_sec": round(on_time / seconds, 3),
+        "stale": late + lost,
+        "stale_late": late,
+        "stale_lost_on_crash": lost,
+        "still_held_at_end": stranded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=40)
+    parser.add_argument("--hours", type=float, default=6)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    seconds = int(args.hours * 3600)
+    results = [simulate(mode, args.workers, seconds, args.seed) for mode in ("fixed", "adaptive")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Dashboard worker-list serialization time with 1k and 10k registered workers.
+
+Builds synthetic worker rows with the types psycopg returns (Decimal,
+datetime, IPv4Address) and times the whole rows -> response bytes path:
+  before  per-row dict of converted values, process_workers on ISO strings,
+          then starlette's JSONResponse
+  after   db.process_workers on the raw rows, then protocol.FastJSONResponse
+          (orjson if installed, else compact stdlib json)
+No database needed.
+
+    python bench/dashboard_json_bench.py --workers 1000 10000
+"""
+import argparse
+import ipaddress
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+
+from db import process_workers
+from protocol import FastJSONResponse, orjson
+
+
+def fake_rows(count, seed=1):
+    rng = random.Random(seed)
+    now = datetime.now()
+    return [{
+        "worker_id": f"{rng.getrandbits(128):032x}",
+        "api_key": f"{rng.getrandbits(256):064x}",
+        "cpu_usage": Decimal(f"{rng.uniform(0, 100):.2f}"),
+        "ram_usage": Decimal(f"{rng.uniform(0, 100):.2f}"),
+        "disk_name": "/dev/nvme0n1p2",
+        "disk_usage": Decimal(f"{rng.uniform(0, 100):.2f}"),
+        "net_in": rng.getrandbits(40),
+        "net_out": rng.getrandbits(40),
+        "public_ip": ipaddress.IPv4Address(rng.getrandbits(32)),
+        "created_on": now - timedelta(days=3),
+        "last_updated": now - timedelta(seconds=rng.uniform(0, 7200)),
+        "queue": rng.randint(0, 2000),
+    } for _ in range(count)]
+
+
+def with_sql_columns(rows):
+    """The idle_sec / active columns the listing query computes in SQL."""
+    now = datetime.now()
+    out = []
+    for r in rows:
+        idle = Decimal(f"{(now - r['last_updated']).total_seconds():.6f}")
+        out.append({**r, "idle_sec": idle, "active": idle <= 60})
+    return out
+
+
+def convert_rows_before(rows):
+    """What db_read_all_workers did to every row before returning it."""
+    workers = []
+    for r in rows:
+        workers.append({
+            "worker_id": r["worker_id"],
+            "api_key": r["api_key"],
+            "cpu_usage": float(r["cpu_usage"]) if r["cpu_usage"] is not None else None,
+            "ram_usage": float(r["ram_usage"]) if r["ram_usage"] is not None else None,
+            "disk_name": r["disk_name"],
+            "disk_usage": float(r["disk_usage"]) if r["disk_usage"] is not None else None,
+            "net_in": int(r["net_in"]) if r["net_in"] is not None else None,
+            "net_out": int(r["net_out"]) if r["net_out"] is not None else None,
+            "public_ip": str(r["public_ip"]) if r["public_ip"] is not None else None,
+            "created_on": r["created_on"].isoformat() if r["created_on"] else None,
+            "last_updated": r["last_updated"].isoformat() if r["last_updated"] else None,
+            "queue": r["queue"] if r["queue"] else 0,
+        })
+    return workers
+
+
+def process_workers_before(raw_workers):
+    """The previous process_workers, on the converted rows."""
+    worker_nodes = []
+    now = datetime.now()
+    for i, w in enumerate(raw_workers, start=1):
+        last_updated = datetime.fromisoformat(w["last_updated"])
+        diff_sec = (now - last_updated).total_seconds()
+        status = "active" if diff_sec <= 60 else "idle"
+        ram_total = 16
+        ram_percent = round(w["ram_usage"])
+        ram_used = round((ram_percent / 100) * ram_total)
+        disk_total = 250
+        disk_percent = round(w["disk_usage"])
+        disk_used = round((disk_percent / 100) * disk_total)
+        if diff_sec <= 30:
+            last_active = "just now"
+        elif diff_sec < 60:
+            last_active = f"{int(diff_sec)}s ago"
+        elif diff_sec < 3600:
+            last_active = f"{int(diff_sec//60)}m ago"
+        else:
+            last_active = f"{int(diff_sec//3600)}h ago"
+        worker_nodes.append({
+            "id": w["worker_id"],
+            "worker_id": w["worker_id"],
+            "status": status,
+            "ip": w["public_ip"] or f"192.168.0.{100+i}",
+            "urls_onqueue": w["queue"],
+            "cpu_usage": round(w["cpu_usage"]),
+            "ram_usage": {"used": ram_used, "total": ram_total, "percent": ram_percent},
+            "disk_name": w["disk_name"],
+            "disk_usage": {"used": disk_used, "total": disk_total, "percent": disk_percent},
+            "last_active": last_active,
+            "network_in": w["net_in"],
+            "network_out": w["net_out"],
+        })
+    return {"worker_nodes": worker_nodes}
+
+
+def before(rows):
+    return JSONResponse(process_workers_before(convert_rows_before(rows))).body
+
+
+def after(rows):
+    return FastJSONResponse(process_workers(rows)).body
+
+
+def timed_ms(fn, rows, budget):
+    calls = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < budget or calls < 3:
+        fn(rows)
+        calls += 1
+    return round((time.perf_counter() - started) / calls * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per timing")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.workers:
+        rows = fake_rows(count)
+        sql_rows = with_sql_columns(rows)
+        old, new = json.loads(before(rows)), json.loads(after(sql_rows))
+        assert [w["status"] for w in old["worker_nodes"]] == [w["status"] for w in new["worker_nodes"]]
+        before_ms = timed_ms(before, rows, args.budget)
+        after_ms = timed_ms(after, sql_rows, args.budget)
+        results.append({
+            "workers": count,
+            "before_ms": before_ms,
+            "after_ms": after_ms,
+            "speedup": round(before_ms / after_ms, 2),
+            "bytes": len(after(sql_rows)),
+        })
+    print(json.dumps({"orjson_installed": orjson is not None, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+big_queue enqueue latency vs. batch size.
+
+Uses DB_URL from .env and writes to big_queue as worker "bench-enqueue",
+deleting those rows after every batch. For each batch size it times the old
+per-row executemany INSERT next to db.batch_insert_queue(), forced down
+its unnest path and its COPY path.
+
+    python bench/enqueue_bench.py --sizes 60 180 1000 5000 20000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+WORKER_ID = "bench-enqueue"
+
+
+async def executemany_insert(urls, worker_id):
+    assigned_at = datetime.utcnow()
+    async with db.get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.executemany(
+                "INSERT INTO big_queue (worker_id, unresolved_url, assigned_at) VALUES (%s, %s, %s)",
+                [(worker_id, url, assigned_at) for url in urls],
+            )
+
+
+async def unnest_insert(urls, worker_id):
+    db.COPY_THRESHOLD = len(urls) + 1
+    return await db.batch_insert_queue(urls, worker_id)
+
+
+async def copy_insert(urls, worker_id):
+    db.COPY_THRESHOLD = 1
+    return await db.batch_insert_queue(urls, worker_id)
+
+
+async def cleanup():
+    async with db.get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("DELETE FROM big_queue WHERE worker_id = %s;", (WORKER_ID,))
+
+
+async def measure(fn, size, repeat):
+    timings = []
+    for r in range(repeat):
+        urls = [f"https://bit.ly/bench{r}x{i}" for i in range(size)]
+        start = time.perf_counter()
+        await fn(urls, WORKER_ID)
+        timings.append((time.perf_counter() - start) * 1000)
+        await cleanup()
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "urls_per_sec": round(size / (statistics.median(timings) / 1000)),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[60, 180, 1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--executemany-max", type=int, default=5000,
+                        help="largest batch to time the per-row executemany at")
+    args = parser.parse_args()
+
+    await db.open_pools()
+    default_threshold = db.COPY_THRESHOLD
+    results = []
+    try:
+        for size in args.sizes:
+            row = {"batch": size}
+            if size <= args.executemany_max:
+                row["executemany"] = await measure(executemany_insert, size, args.repeat)
+            row["unnest"] = await measure(unnest_insert, size, args.repeat)
+            row["copy"] = await measure(copy_insert, size, args.repeat)
+            results.append(row)
+    finally:
+        db.COPY_THRESHOLD = default_threshold
+        await cleanup()
+        await db.close_pools()
+    print(json.dumps({"copy_threshold": default_threshold, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
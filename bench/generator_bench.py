@@ -0,0 +1,207 @@
+"""
+Code generator benchmark and property checks (no database needed).
+
+Checks, for every service in generator.GENERATORS:
+  - contiguous ranges match an itertools.product reference across every
+    length boundary that is small enough to enumerate
+  - splitting a range at any point gives the same codes (no gaps, no repeats
+    between consecutive leases)
+  - random positions round-trip: code -> rank -> same position
+  - the end of the keyspace is reported, not wrapped
+plus an exhaustive run on a toy alphabet. Then measures codes/sec and
+per-batch latency at cursor positions from 0 up to deep in the keyspace,
+next to the old islice-based enumeration where that is still feasible.
+
+    python bench/generator_bench.py                # checks + benchmark
+    python bench/generator_bench.py --checks-only
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generator
+from generator import GENERATORS, enumerate_codes, keyspace_size, locate
+
+BATCH = generator.one_chunk
+
+
+def rank(service, code):
+    """Inverse of enumerate_codes: keyspace position of `code`."""
+    allowed, lengths = GENERATORS[service]
+    base = len(allowed)
+    index = sum(base ** length for length in lengths if length < len(code))
+    offset = 0
+    for ch in code:
+        offset = offset * base + allowed.index(ch)
+    return index + offset
+
+
+def reference(service, limit):
+    """First `limit` codes via itertools.product, length by length."""
+    allowed, lengths = GENERATORS[service]
+    out = []
+    for length in lengths:
+        for combo in itertools.product(allowed, repeat=length):
+            out.append("".join(combo))
+            if len(out) >= limit:
+                return out
+    return out
+
+
+def legacy_enumerate(service, current_index, count):
+    """The islice loop generate_service used before locate()."""
+    allowed, lengths = GENERATORS[service]
+    result = []
+    for length in lengths:
+        combinations = itertools.product(allowed, repeat=length)
+        for combo in itertools.islice(combinations, current_index, current_index + count - len(result)):
+            result.append("".join(combo))
+        if len(result) >= count:
+            break
+    return result
+
+
+def boundaries(service):
+    """Keyspace positions where the code length changes."""
+    allowed, lengths = GENERATORS[service]
+    total = 0
+    for length in lengths:
+        total += len(allowed) ** length
+        yield length, total
+
+
+def check_service(service, rng):
+    allowed, lengths = GENERATORS[service]
+    failures = []
+
+    def expect(cond, message):
+        if not cond:
+            failures.append(message)
+
+    # Prefix of the keyspace against itertools, over the first boundary or two
+    ref_len = min(300_000, keyspace_size(service))
+    ref = reference(service, ref_len)
+    got = []
+    position = 0
+    while position < ref_len:
+        size = rng.randint(1, 500)
+        got += enumerate_codes(service, position, min(size, ref_len - position))
+        position += size
+    expect(got == ref, f"{service}: first {ref_len} codes differ from itertools.product")
+    expect(len(set(got)) == len(got), f"{service}: duplicate codes in first {ref_len}")
+
+    # Every length boundary: last codes of length L, then first of L + 1
+    for length, edge in boundaries(service):
+        if edge >= keyspace_size(service):
+            tail = enumerate_codes(service, edge - 3, 10)
+            expect(len(tail) == 3, f"{service}: keyspace end returned {len(tail)} codes, expected 3")
+            expect(locate(service, edge) is None, f"{service}: position past the end located")
+            continue
+        codes = enumerate_codes(service, edge - 3, 6)
+        expect(codes[2] == allowed[-1] * length, f"{service}: code before boundary {length} is {codes[2]!r}")
+        expect(codes[3] == allowed[0] * (length + 1), f"{service}: code after boundary {length} is {codes[3]!r}")
+        expect([len(c) for c in codes] == [length] * 3 + [length + 1] * 3,
+               f"{service}: wrong lengths around boundary {length}")
+        expect(len(set(codes)) == 6, f"{service}: repeats around boundary {length}")
+
+    # Split invariance and rank round trip at random depths
+    total = keyspace_size(service)
+    for _ in range(300):
+        start = rng.randrange(0, total - 2 * BATCH) if rng.random() < 0.5 else rng.randrange(0, 10 ** rng.randint(1, 15))
+        split = rng.randint(0, 2 * BATCH)
+        whole = enumerate_codes(service, start, 2 * BATCH)
+        parts = enumerate_codes(service, start, split) + enumerate_codes(service, start + split, 2 * BATCH - split)
+        expect(whole == parts, f"{service}: split at {start}+{split} changes the codes")
+        expect([rank(service, c) for c in whole] == list(range(start, start + len(whole))),
+               f"{service}: rank round trip fails near {start}")
+        if failures:
+            break
+
+    expect(enumerate_codes(service, total, 5) == [], f"{service}: codes returned past the end")
+    return failures
+
+
+def check_toy():
+    """Exhaustive: the whole keyspace of a tiny alphabet in random leases."""
+    GENERATORS["_toy"] = (["x", "y", "z"], range(2, 6))
+    try:
+        ref = reference("_toy", 10 ** 6)
+        rng = random.Random(7)
+        got, position = [], 0
+        while True:
+            batch = enumerate_codes("_toy", position, rng.randint(1, 40))
+            if not batch:
+                break
+            got += batch
+            position += len(batch)
+        ok = got == ref and len(set(got)) == len(got) == keyspace_size("_toy")
+        return [] if ok else ["_toy: exhaustive enumeration differs from itertools.product"]
+    finally:
+        del GENERATORS["_toy"]
+
+
+def run_checks(seed):
+    rng = random.Random(seed)
+    failures = check_toy()
+    for service in GENERATORS:
+        failures += check_service(service, rng)
+    return failures
+
+
+def time_batches(fn, service, position, budget=0.5):
+    """(codes per second, mean ms per batch) for BATCH-sized calls at `position`."""
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        fn(service, position, BATCH)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= budget or (calls >= 3 and elapsed > 5):
+            break
+    return round(calls * BATCH / elapsed), round(elapsed / calls * 1000, 4)
+
+
+def run_benchmark(legacy_limit):
+    results = []
+    for service in GENERATORS:
+        positions = [0, 10 ** 3, 10 ** 6, 10 ** 9, 10 ** 12, 10 ** 15]
+        positions += [edge - BATCH // 2 for _, edge in list(boundaries(service))[:4]]
+        for position in sorted(set(p for p in positions if p + BATCH <= keyspace_size(service))):
+            rate, ms = time_batches(enumerate_codes, service, position)
+            row = {"service": service, "position": position, "codes_per_sec": rate, "ms_per_batch": ms}
+            if position <= legacy_limit:
+                old_rate, old_ms = time_batches(legacy_enumerate, service, position)
+                row["legacy_codes_per_sec"] = old_rate
+                row["legacy_ms_per_batch"] = old_ms
+            results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--checks-only", action="store_true")
+    parser.add_argument("--legacy-limit", type=int, default=10 ** 6,
+                        help="deepest position to time the old islice enumeration at")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    failures = run_checks(args.seed)
+    print(f"[checks] {len(failures)} failures in {time.perf_counter() - started:.1f}s")
+    for failure in failures:
+        print(f"  FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    if args.checks_only:
+        return
+    print(json.dumps(run_benchmark(args.legacy_limit), indent=2))
+
+
+if __name__ == "__main__":
+    main()
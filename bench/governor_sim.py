@@ -0,0 +1,66 @@
+"""
+Host governor under steady and spiking error rates (governor.HostGovernor).
+No server or DB is involved: one service gets --per-sec results a second,
+each an error with the given probability, and the run reports how often the
+budget was halved and the mean rate. Steady rates should cause no backoffs;
+the spike scenarios (baseline -> spike for a minute) should.
+
+    python bench/governor_sim.py [--minutes 30] [--per-sec 100] [--seed 1]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import governor
+
+LIMIT = 100
+STEADY = (0.0, 0.01, 0.1, 0.5, 0.9, 0.98, 0.995)
+SPIKES = ((0.01, 0.6), (0.01, 0.9), (0.05, 0.8), (0.2, 0.9), (0.9, 1.0))
+SPIKE_AT = 600
+SPIKE_FOR = 60
+
+
+def simulate(error_rate, seconds, per_sec, seed):
+    """`error_rate(t)` -> probability; returns (backoffs, mean rate)."""
+    rng = random.Random(seed)
+    g = governor.HostGovernor(LIMIT, now=0)
+    backoffs = 0
+    rates = []
+    for t in range(seconds):
+        p = error_rate(t)
+        for i in range(per_sec):
+            before = g.last_backoff
+            g.observe(rng.random() < p, now=t + i / per_sec)
+            backoffs += g.last_backoff != before
+        g._refill(t)
+        rates.append(g.rate)
+    return backoffs, round(sum(rates) / len(rates), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--per-sec", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    seconds = int(args.minutes * 60)
+    results = {"steady": {}, "spike": {}}
+    for p in STEADY:
+        backoffs, rate = simulate(lambda t: p, seconds, args.per_sec, args.seed)
+        results["steady"][str(p)] = {"backoffs": backoffs, "mean_rate": rate}
+    for base, spike in SPIKES:
+        during = lambda t: spike if SPIKE_AT <= t < SPIKE_AT + SPIKE_FOR else base
+        backoffs, rate = simulate(during, seconds, args.per_sec, args.seed)
+        results["spike"][f"{base}->{spike}"] = {"backoffs": backoffs, "mean_rate": rate}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
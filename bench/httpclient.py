@@ -0,0 +1,104 @@
+"""
+Minimal keep-alive HTTP/1.1 client on asyncio streams, so the bench scripts
+need nothing beyond the server's own dependencies.
+"""
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+
+
+class HTTPClient:
+    def __init__(self, host="127.0.0.1", port=8000):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+
+    async def request(self, method, path, headers=None, body=b"", content_type=None):
+        """Returns (status, headers, body bytes, seconds)."""
+        if self.writer is None:
+            await self._connect()
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        for key, value in (headers or {}).items():
+            lines.append(f"{key}: {value}")
+        if content_type:
+            lines.append(f"Content-Type: {content_type}")
+        lines.append(f"Content-Length: {len(body)}")
+        start = time.perf_counter()
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            await self.close()
+            raise ConnectionError("Server closed the connection")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            response_headers[key.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding") == "chunked":
+            data = bytearray()
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                data += await self.reader.readexactly(size)
+                await self.reader.readline()
+            data = bytes(data)
+        else:
+            data = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+
+        if response_headers.get("connection") == "close":
+            await self.close()
+        return status, response_headers, data, time.perf_counter() - start
+
+    async def get_json(self, path, headers=None):
+        status, _, data, elapsed = await self.request("GET", path, headers)
+        return status, json.loads(data) if data else None, elapsed
+
+    async def post_form(self, path, fields, headers=None):
+        body = urlencode(fields).encode()
+        status, _, data, elapsed = await self.request(
+            "POST", path, headers, body, "application/x-www-form-urlencoded"
+        )
+        return status, json.loads(data) if data else None, elapsed
+
+    async def post_json(self, path, payload, headers=None):
+        body = json.dumps(payload).encode()
+        status, _, data, elapsed = await self.request("POST", path, headers, body, "application/json")
+        return status, json.loads(data) if data else None, elapsed
+
+
+async def wait_until_up(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        client = HTTPClient(host, port)
+        try:
+            status, _, _, _ = await client.request("GET", "/")
+            if status < 500:
+                return True
+        except OSError:
+            pass
+        finally:
+            await client.close()
+        await asyncio.sleep(0.5)
+    return False
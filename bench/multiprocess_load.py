@@ -0,0 +1,95 @@
+"""
+/tasks and /result throughput with 1, 2, 4... uvicorn worker processes.
+
+Needs the database from .env (DB_URL) with structure.sql applied; every run
+consumes generator cursor ranges and writes notfound results, so point it at
+a scratch database. For each process count it starts
+`uvicorn main:app --workers N`, registers fake workers that loop
+/tasks -> /result(notfound), and reports requests per second.
+
+    python bench/multiprocess_load.py --processes 1 2 4 --clients 64 --seconds 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from httpclient import HTTPClient, wait_until_up
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def fake_worker(host, port, stop_at, counts):
+    client = HTTPClient(host, port)
+    try:
+        status, creds, _ = await client.get_json("/register")
+        headers = {"X-Worker-ID": creds["worker_id"], "X-API-Key": creds["api_key"]}
+        while time.monotonic() < stop_at:
+            status, urls, _ = await client.get_json("/tasks", headers)
+            counts["tasks"] += 1
+            if status != 200 or not isinstance(urls, list):
+                counts["errors"] += 1
+                continue
+            for url in urls:
+                if time.monotonic() >= stop_at:
+                    break
+                status, _, _ = await client.post_form(
+                    "/result", {"status": "notfound", "unresolved_url": url}, headers
+                )
+                counts["result"] += 1
+                if status != 200:
+                    counts["errors"] += 1
+    finally:
+        await client.close()
+
+
+async def drive(host, port, clients, seconds):
+    counts = {"tasks": 0, "result": 0, "errors": 0}
+    stop_at = time.monotonic() + seconds
+    await asyncio.gather(*(fake_worker(host, port, stop_at, counts) for _ in range(clients)))
+    return counts
+
+
+def run_one(processes, port, clients, seconds):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(processes), "--log-level", "warning"],
+        cwd=ROOT,
+    )
+    try:
+        if not asyncio.run(wait_until_up("127.0.0.1", port)):
+            raise RuntimeError("server did not come up")
+        counts = asyncio.run(drive("127.0.0.1", port, clients, seconds))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {
+        "processes": processes,
+        "tasks_per_sec": round(counts["tasks"] / seconds, 1),
+        "result_per_sec": round(counts["result"] / seconds, 1),
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    results = [run_one(n, args.port, args.clients, args.seconds) for n in args.processes]
+    base = results[0]
+    for r in results:
+        r["result_scaling"] = round(r["result_per_sec"] / base["result_per_sec"], 2) if base["result_per_sec"] else None
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Query latency vs. worker pool size under concurrent load.
+
+Uses DB_URL from .env. For each pool size it runs --concurrency coroutines,
+each repeatedly taking a connection through db.get_connection() and running
+one representative hot-path statement, then reports p50/p95/p99 end-to-end
+latency, throughput and the pool's own wait/timeout counters.
+
+    python bench/pool_latency.py --sizes 5 10 20 50 100 --concurrency 200 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+QUERY = "SELECT state FROM statefull WHERE state_type = 'queue_hold';"
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run_size(size, concurrency, seconds):
+    db.POOL_SIZES["worker"] = (min(size, db.POOL_SIZES["worker"][0]), size)
+    db.pools.clear()
+    await db.open_pools()
+    await db.pools["worker"].wait()
+
+    latencies = []
+    stop_at = time.monotonic() + seconds
+
+    async def client():
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                async with db.get_connection() as conn:
+                    async with conn.cursor() as cur:
+                        await cur.execute(QUERY)
+                        await cur.fetchone()
+            except Exception:
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    stats = db.pool_stats()["worker"]
+    await db.close_pools()
+    return {
+        "pool_max": size,
+        "queries_per_sec": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else None,
+        "pool_wait_ms_avg": stats["wait_ms_avg"],
+        "pool_timeouts": stats["timeouts"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 20, 50, 100])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results.append(await run_size(size, args.concurrency, args.seconds))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Bytes per task and serialization CPU for each worker payload encoding.
+
+Builds realistic /tasks batches with the scheduler's default service split
+(codes from deep in each keyspace) and a typical heartbeat, then reports
+raw and gzip size per URL / per heartbeat and encode + decode time for
+plain JSON, prefix-grouped JSON and, if installed, msgpack.
+
+    python bench/protocol_bench.py --sizes 60 180 1000
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generator import SERVICES, materialize
+from protocol import group_urls, msgpack, ungroup_urls
+from scheduler import allocate_batch
+
+
+def sample_urls(total):
+    urls = []
+    for service, count in allocate_batch(total).items():
+        urls += materialize(service, 10 ** 9, count, SERVICES[service])
+    return urls
+
+
+def encoders():
+    out = {
+        "json": (lambda urls: json.dumps(urls).encode(), json.loads),
+        "grouped_json": (
+            lambda urls: json.dumps(group_urls(urls), separators=(",", ":")).encode(),
+            lambda data: ungroup_urls(json.loads(data)),
+        ),
+    }
+    if msgpack is not None:
+        out["msgpack"] = (msgpack.packb, msgpack.unpackb)
+        out["grouped_msgpack"] = (
+            lambda urls: msgpack.packb(group_urls(urls)),
+            lambda data: ungroup_urls(msgpack.unpackb(data)),
+        )
+    return out
+
+
+def per_call_us(fn, arg, budget):
+    calls = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < budget:
+        fn(arg)
+        calls += 1
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def bench_tasks(sizes, budget):
+    results = []
+    for size in sizes:
+        urls = sample_urls(size)
+        row = {"batch": len(urls)}
+        for name, (enc, dec) in encoders().items():
+            data = enc(urls)
+            assert list(dec(data)) == urls, name
+            row[name] = {
+                "bytes_per_url": round(len(data) / len(urls), 2),
+                "gzip_bytes_per_url": round(len(gzip.compress(data, 6)) / len(urls), 2),
+                "encode_us": round(per_call_us(enc, urls, budget), 1),
+                "decode_us": round(per_call_us(dec, data, budget), 1),
+                "gzip_us": round(per_call_us(lambda d: gzip.compress(d, 6), data, budget), 1),
+            }
+        results.append(row)
+    return results
+
+
+def bench_heartbeat(budget):
+    nested = {
+        "cpu_usage": 37.5,
+        "ram_usage": 61.2,
+        "disk_usage": {"name": "/dev/nvme0n1p2", "percent": 48.3},
+        "network": {"in": 18446744073, "out": 9223372036},
+        "public_ip": "203.0.113.42",
+    }
+    flat = [37.5, 61.2, "/dev/nvme0n1p2", 48.3, 18446744073, 9223372036, "203.0.113.42"]
+    forms = {"json_nested": (json.dumps, nested), "json_flat": (json.dumps, flat)}
+    if msgpack is not None:
+        forms["msgpack_nested"] = (msgpack.packb, nested)
+        forms["msgpack_flat"] = (msgpack.packb, flat)
+    out = {}
+    for name, (enc, payload) in forms.items():
+        data = enc(payload)
+        out[name] = {
+            "bytes": len(data),
+            "encode_us": round(per_call_us(enc, payload, budget), 2),
+        }
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[60, 180, 1000])
+    parser.add_argument("--budget", type=float, default=0.3, help="seconds per timing")
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "msgpack_installed": msgpack is not None,
+        "tasks": bench_tasks(args.sizes, args.budget),
+        "heartbeat": bench_heartbeat(args.budget),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Server import time, by module.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and
+reports the median total plus the cumulative time of the heaviest top-level
+imports and the self time of this repo's own modules. No database needed;
+warm-up time is logged by the server itself ("Warm-up done in ...ms") and
+shown on /healthz.
+
+    python bench/startup_bench.py --runs 5
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def one_run():
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stderr
+    own = {name[:-3] for name in os.listdir(ROOT) if name.endswith(".py")}
+    top, self_us, total = {}, {}, None
+    for match in LINE.finditer(out):
+        self_time, cumulative, indent, name = int(match[1]), int(match[2]), len(match[3]) - 1, match[4]
+        if name == "main":
+            total = cumulative
+        if indent == 2:
+            top[name] = cumulative
+        if name in own:
+            self_us[name] = self_time
+    return total, top, self_us
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [one_run() for _ in range(args.runs)]
+    median = lambda values: round(statistics.median(values) / 1000, 1)
+    tops = {name for _, top, _ in runs for name in top}
+    own = {name for _, _, self_us in runs for name in self_us}
+    top_ms = {name: median([top.get(name, 0) for _, top, _ in runs]) for name in tops}
+    own_ms = {name: median([self_us.get(name, 0) for _, _, self_us in runs]) for name in own}
+    print(json.dumps({
+        "import_main_ms": median([total for total, _, _ in runs]),
+        "heaviest_imports_ms": dict(sorted(top_ms.items(), key=lambda kv: -kv[1])[:args.top]),
+        "own_modules_self_ms": dict(sorted(own_ms.items(), key=lambda kv: -kv[1])),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
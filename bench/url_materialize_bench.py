@@ -0,0 +1,116 @@
+"""
+Full-URL construction speed for task batches of 60 to 100k codes.
+
+Compares generator.materialize() (suffix-table blocks, URLs built in one
+concatenation each) against the per-code approaches it replaced:
+  product_join  itertools.product, ''.join per tuple, then a second pass to
+                prepend the service prefix (the original generator loop,
+                best case: no islice skipping)
+  odometer      per-code digit odometer, then the prefix pass
+Each result is checked against materialize() before timing. Also times
+materialize() with other SUFFIX_DIGITS settings.
+
+    python bench/url_materialize_bench.py --service bitly --position 1000000000
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generator
+from generator import GENERATORS, SERVICES, locate, materialize
+
+
+def product_join(service, start, count):
+    allowed, _ = GENERATORS[service]
+    length, offset = locate(service, start)
+    combos = itertools.islice(itertools.product(allowed, repeat=length), offset, offset + count)
+    codes = [''.join(combo) for combo in combos]
+    prefix = SERVICES[service]
+    return [f"{prefix}{code}" for code in codes]
+
+
+def odometer(service, start, count):
+    allowed, lengths = GENERATORS[service]
+    length, offset = locate(service, start)
+    base = len(allowed)
+    digits = [0] * length
+    for i in range(length - 1, -1, -1):
+        offset, digits[i] = divmod(offset, base)
+    codes = []
+    last = base - 1
+    while len(codes) < count:
+        codes.append(''.join([allowed[d] for d in digits]))
+        i = length - 1
+        while i >= 0 and digits[i] == last:
+            digits[i] = 0
+            i -= 1
+        if i >= 0:
+            digits[i] += 1
+        else:
+            length += 1
+            if length not in lengths:
+                break
+            digits = [0] * length
+    prefix = SERVICES[service]
+    return [f"{prefix}{code}" for code in codes]
+
+
+def blocks(service, start, count):
+    return materialize(service, start, count, SERVICES[service])
+
+
+def timed(fn, service, start, count, budget):
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        fn(service, start, count)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= budget:
+            break
+    per_call = elapsed / calls
+    return {"ms_per_batch": round(per_call * 1000, 4), "urls_per_sec": round(count / per_call)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--service", default="bitly", choices=sorted(GENERATORS))
+    parser.add_argument("--position", type=int, default=10 ** 9)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[60, 1000, 10_000, 100_000])
+    parser.add_argument("--suffix-digits", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per measurement")
+    args = parser.parse_args()
+
+    # product_join can only stay within one length without paying for islice
+    length, offset = locate(args.service, args.position)
+    size = len(GENERATORS[args.service][0]) ** length
+    start = args.position - offset + min(offset, size - max(args.sizes))
+    skip_product = offset > 1_000_000
+
+    default_digits = generator.SUFFIX_DIGITS
+    results = []
+    for count in args.sizes:
+        expected = blocks(args.service, start, count)
+        row = {"batch": count}
+        for name, fn in (("product_join", product_join), ("odometer", odometer)):
+            if name == "product_join" and skip_product:
+                continue
+            assert fn(args.service, start, count) == expected, name
+            row[name] = timed(fn, args.service, start, count, args.budget)
+        for digits in args.suffix_digits:
+            generator.SUFFIX_DIGITS = digits
+            assert blocks(args.service, start, count) == expected, f"materialize/{digits}"
+            row[f"materialize_{digits}"] = timed(blocks, args.service, start, count, args.budget)
+        generator.SUFFIX_DIGITS = default_digits
+        results.append(row)
+
+    print(json.dumps({"service": args.service, "position": start, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+from db import *
+from generator import SERVICES, split_service
+
+log = logging.getLogger(__name__)
+
+# Per-service set of codes that already have a final outcome
+# (scraped_pages / noredirect / notfound). Sized with BLOOM_CAPACITY entries per
+# service at BLOOM_ERROR_RATE false positives: 300M entries at 1% is ~360 MB.
+BLOOM_DIR = os.getenv("BLOOM_DIR", "bloom")
+BLOOM_CAPACITY = int(os.getenv("BLOOM_CAPACITY", "10000000"))
+BLOOM_ERROR_RATE = float(os.getenv("BLOOM_ERROR_RATE", "0.01"))
+BLOOM_MMAP = os.getenv("BLOOM_MMAP", "0") == "1"
+BLOOM_SNAPSHOT_INTERVAL = 300
+
+_HEADER = struct.Struct("<8sQQQ")  # magic, bit count, hash count, item count
+_MAGIC = b"URLBLOOM"
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01, bits=None, m=None, k=None, count=0):
+        if m is None:
+            m = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+            m = max(64, (m + 7) // 8 * 8)
+        if k is None:
+            k = max(1, round(m / capacity * math.log(2)))
+        self.m = m
+        self.k = k
+        self.count = count
+        self.bits = bits if bits is not None else bytearray(m // 8)
+        self._mmap = None
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self, key: str):
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str):
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def merge(self, other: "BloomFilter"):
+        """Bitwise OR another filter of the same shape into this one."""
+        if (self.m, self.k) != (other.m, other.k):
+            raise ValueError("Cannot merge bloom filters of different shape")
+        step = 1 << 20
+        for offset in range(0, len(self.bits), step):
+            a = int.from_bytes(self.bits[offset:offset + step], "little")
+            b = int.from_bytes(other.bits[offset:offset + step], "little")
+            size = min(step, len(self.bits) - offset)
+            self.bits[offset:offset + step] = (a | b).to_bytes(size, "little")
+        self.count += other.count
+
+    def save(self, path):
+        header = _HEADER.pack(_MAGIC, self.m, self.k, self.count)
+        if self._mmap is not None:
+            self._mmap[:_HEADER.size] = header
+            self._mmap.flush()
+            return
+        # A temp file of its own: every server process saves at shutdown
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                os.fchmod(f.fileno(), 0o644)  # mkstemp makes it owner-only
+                f.write(header)
+                f.write(self.bits)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, use_mmap=False):
+        with open(path, "r+b" if use_mmap else "rb") as f:
+            magic, m, k, count = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a bloom filter snapshot")
+            if use_mmap:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+                bf = cls(None, m=m, k=k, count=count, bits=memoryview(mm)[_HEADER.size:])
+                bf._mmap = mm
+                return bf
+            bits = bytearray(m // 8)
+            f.readinto(bits)
+        return cls(None, m=m, k=k, count=count, bits=bits)
+
+    def close(self):
+        if self._mmap is not None:
+            self.bits.release()
+            self._mmap.close()
+            self._mmap = None
+
+
+RESOLVED: dict[str, BloomFilter] = {}
+
+
+def _new_filter():
+    return BloomFilter(BLOOM_CAPACITY, BLOOM_ERROR_RATE)
+
+def _snapshot_path(service):
+    return os.path.join(BLOOM_DIR, f"{service}.bloom")
+
+def mark_resolved(url):
+    service, code = split_service(url)
+    if service is None:
+        return
+    bf = RESOLVED.get(service)
+    if bf is None:
+        bf = RESOLVED[service] = _new_filter()
+    bf.add(code)
+
+def is_resolved(url):
+    service, code = split_service(url)
+    bf = RESOLVED.get(service)
+    return bf is not None and code in bf
+
+def filter_unresolved(urls):
+    """Split urls into (still to scrape, already resolved)."""
+    fresh, skipped = [], []
+    for url in urls:
+        (skipped if is_resolved(url) else fresh).append(url)
+    return fresh, skipped
+
+
+# ---- Snapshots ----
+def load_snapshots():
+    for service in SERVICES:
+        path = _snapshot_path(service)
+        try:
+            RESOLVED[service] = BloomFilter.load(path, use_mmap=BLOOM_MMAP)
+            log.info("Loaded %s snapshot (%d entries)", service, RESOLVED[service].count)
+        except FileNotFoundError:
+            RESOLVED.setdefault(service, _new_filter())
+        except Exception as e:
+            log.warning("Failed to load %s snapshot: %s", service, e)
+            RESOLVED.setdefault(service, _new_filter())
+
+def save_snapshots():
+    os.makedirs(BLOOM_DIR, exist_ok=True)
+    for service, bf in RESOLVED.items():
+        try:
+            bf.save(_snapshot_path(service))
+        except Exception as e:
+            log.warning("Failed to save %s snapshot: %s", service, e)
+
+
+# ---- Background rebuild ----
+async def rebuild_resolved_filters():
+    rebuilt = {service: _new_filter() for service in SERVICES}
+    async for urls in db_iter_resolved_urls():
+        for url in urls:
+            service, code = split_service(url)
+            if service is not None:
+                rebuilt[service].add(code)
+        await asyncio.sleep(0)
+
+    # Keep whatever was marked while the rebuild was streaming
+    for service, bf in rebuilt.items():
+        live = RESOLVED.get(service)
+        if live is not None and (live.m, live.k) == (bf.m, bf.k):
+            rebuilt_count = bf.count
+            bf.merge(live)
+            bf.count = max(rebuilt_count, live.count)
+        RESOLVED[service] = bf
+        if live is not None:
+            live.close()
+
+    save_snapshots()
+    if BLOOM_MMAP:
+        load_snapshots()
+    log.info("Rebuilt from DB", extra={"entries": {s: bf.count for s, bf in RESOLVED.items()}})
+
+async def resolved_filter_worker():
+    try:
+        await rebuild_resolved_filters()
+    except Exception:
+        log.exception("Rebuild failed")
+    while True:
+        await asyncio.sleep(BLOOM_SNAPSHOT_INTERVAL)
+        save_snapshots()
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from db import *
+
+log = logging.getLogger(__name__)
+
+# Several server processes (uvicorn --workers N, or several hosts) share one
+# database. Each process heartbeats a row in server_nodes so per-host budgets
+# can be split between live processes, and LISTEN/NOTIFY on CLUSTER_CHANNEL
+# carries "something changed" events between them.
+NODE_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+CLUSTER_CHANNEL = "urldrill"
+NODE_HEARTBEAT = 10
+NODE_TIMEOUT = 30
+LIVE_NODES = 1
+
+_handlers: dict[str, list] = {}
+
+
+def subscribe(kind, handler):
+    """Run `handler(payload)` (async) when another process publishes `kind`."""
+    _handlers.setdefault(kind, []).append(handler)
+
+async def publish(kind, payload=None):
+    message = json.dumps({"kind": kind, "node": NODE_ID, "payload": payload})
+    try:
+        await db_notify(CLUSTER_CHANNEL, message)
+    except Exception as e:
+        log.warning("Publish %s failed: %s", kind, e)
+
+async def _dispatch(raw):
+    try:
+        message = json.loads(raw)
+    except json.JSONDecodeError:
+        return
+    if message.get("node") == NODE_ID:
+        return  # already applied locally
+    for handler in _handlers.get(message.get("kind"), []):
+        try:
+            await handler(message.get("payload"))
+        except Exception:
+            log.exception("Handler for %s failed", message.get("kind"))
+
+async def cluster_listener():
+    while True:
+        try:
+            conn = await open_listen_connection()
+            async with conn:
+                await conn.execute(f"LISTEN {CLUSTER_CHANNEL};")
+                async for notify in conn.notifies():
+                    await _dispatch(notify.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Listener failed: %s", e)
+        await asyncio.sleep(5)
+
+async def node_heartbeat(on_change=None):
+    global LIVE_NODES
+    while True:
+        try:
+            live = max(1, await db_node_heartbeat(NODE_ID, NODE_TIMEOUT))
+            if live != LIVE_NODES:
+                log.info("%d server processes alive", live, extra={"nodes": live})
+                LIVE_NODES = live
+                if on_change is not None:
+                    on_change(live)
+        except Exception as e:
+            log.warning("Heartbeat failed: %s", e)
+        await asyncio.sleep(NODE_HEARTBEAT)
+
+async def leave_cluster():
+    try:
+        await asyncio.wait_for(db_remove_node(NODE_ID), 5)
+    except Exception as e:
+        log.warning("Failed to deregister %s: %s", NODE_ID, e)
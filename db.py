@@ -11,34 +11,143 @@ from psycopg.rows import dict_row
 from psycopg_pool import AsyncConnectionPool
 from typing import List, Dict, Any
 from contextlib import asynccontextmanager
+import time
+from tracing import current_trace, record_query, record_pool_wait
 
 # Connection string (replace with yours as needed)
 load_dotenv()
 DB_URL = os.getenv("DB_URL")
-
-# Async connection pool
-pool: AsyncConnectionPool | None = None
-
-def init_pool():
+# LISTEN needs a session of its own: behind PgBouncer in transaction mode (a
+# "-pooler" endpoint) notifications never arrive, so the cluster listener
+# connects to DB_LISTEN_URL, a direct endpoint, when it is set
+DB_LISTEN_URL = os.getenv("DB_LISTEN_URL") or DB_URL
+
+# Async connection pools, one per route class so dashboard and background
+# reads can never take the connections /tasks and the result batcher need.
+#   worker: /register, /heartbeat, /tasks, /result flushes
+#   admin:  dashboard, admin auth, bloom rebuild, worker cache refresh
+POOL_SIZES = {
+    "worker": (int(os.getenv("DB_POOL_MIN", "5")), int(os.getenv("DB_POOL_MAX", "200"))),
+    "admin": (int(os.getenv("DB_ADMIN_POOL_MIN", "1")), int(os.getenv("DB_ADMIN_POOL_MAX", "10"))),
+}
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Prepared statements break behind PgBouncer in transaction mode, so they are
+# off unless DB_PREPARE_THRESHOLD is set (e.g. 5 for a direct connection)
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD")) if os.getenv("DB_PREPARE_THRESHOLD") else None
+
+class TracedCursor(psycopg.AsyncCursor):
+    """Adds each statement's time to the current request trace, if any."""
+
+    async def execute(self, query, params=None, **kwargs):
+        if current_trace() is None:
+            return await super().execute(query, params, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            record_query(query, (time.perf_counter() - started) * 1000)
+
+pools: dict[str, AsyncConnectionPool] = {}
+pool: AsyncConnectionPool | None = None  # the worker pool
+
+def init_pool(name="worker"):
     global pool
-    if pool is None:
-        pool = AsyncConnectionPool(
+    p = pools.get(name)
+    if p is None:
+        min_size, max_size = POOL_SIZES[name]
+        p = pools[name] = AsyncConnectionPool(
             conninfo=DB_URL,
-            min_size=5,
-            max_size=200,
+            name=name,
+            min_size=min_size,
+            max_size=max_size,
+            timeout=DB_POOL_TIMEOUT,
+            open=False,
             kwargs={
                 "row_factory": dict_row,
-                "prepare_threshold": None  # required for PgBouncer
+                "cursor_factory": TracedCursor,
+                "prepare_threshold": DB_PREPARE_THRESHOLD
             }
         )
-    return pool
+        if name == "worker":
+            pool = p
+    return p
+
+async def open_pools(wait=False):
+    """Open every pool; with `wait`, return only once each has min_size connections."""
+    for name in POOL_SIZES:
+        p = init_pool(name)
+        if p.closed:
+            await p.open(wait=wait, timeout=DB_POOL_TIMEOUT)
+
+async def close_pools():
+    for p in pools.values():
+        await p.close()
+
+def pool_stats():
+    """Per-pool size, in-use/idle connections, waiting clients, wait time and timeouts."""
+    stats = {}
+    for name, p in pools.items():
+        s = p.get_stats()
+        requests = s.get("requests_num", 0)
+        stats[name] = {
+            "size": s.get("pool_size", 0),
+            "max": s.get("pool_max", 0),
+            "idle": s.get("pool_available", 0),
+            "in_use": s.get("pool_size", 0) - s.get("pool_available", 0),
+            "waiting": s.get("requests_waiting", 0),
+            "requests": requests,
+            "queued": s.get("requests_queued", 0),
+            "wait_ms_total": s.get("requests_wait_ms", 0),
+            "wait_ms_avg": round(s.get("requests_wait_ms", 0) / requests, 2) if requests else 0.0,
+            "timeouts": s.get("requests_errors", 0),
+            "connection_errors": s.get("connections_errors", 0),
+        }
+    return stats
 
 @asynccontextmanager
-async def get_connection():
-    p = init_pool()
+async def get_connection(pool_name="worker"):
+    p = init_pool(pool_name)
+    if p.closed:
+        await p.open()  # scripts such as admin.py skip the server startup
+    if current_trace() is None:
+        async with p.connection() as conn:
+            yield conn
+        return
+    started = time.perf_counter()
     async with p.connection() as conn:
+        record_pool_wait((time.perf_counter() - started) * 1000)
         yield conn
 
+async def run_batch(statements, pool_name="worker"):
+    """
+    Run independent (query, params) statements on one connection in a single
+    network round trip (psycopg pipeline mode). Returns, per statement, its
+    rows, or None when it returns no rows.
+    """
+    async with get_connection(pool_name) as conn:
+        cursors = []
+        started = time.perf_counter()
+        # Plain cursors: the batch is traced as one round trip below
+        if psycopg.Pipeline.is_supported():
+            async with conn.pipeline() as pipeline:
+                for query, params in statements:
+                    cur = psycopg.AsyncCursor(conn)
+                    await cur.execute(query, params)
+                    cursors.append(cur)
+                await pipeline.sync()
+        else:
+            for query, params in statements:
+                cur = psycopg.AsyncCursor(conn)
+                await cur.execute(query, params)
+                cursors.append(cur)
+        if current_trace() is not None and statements:
+            record_query(statements[0][0], (time.perf_counter() - started) * 1000, len(statements))
+        results = []
+        for cur in cursors:
+            results.append(await cur.fetchall() if cur.description else None)
+            await cur.close()
+        return results
+
 # ---- CRUD FUNCTIONS ----
 
 async def db_create_worker():
@@ -57,67 +166,63 @@ async def db_create_worker():
             row = await cur.fetchone()
             return row["worker_id"], row["api_key"]
 
-async def db_heartbeat_worker(worker_id, cpu_usage, ram_usage, disk_name, disk_usage, net_in, net_out, public_ip):
-    async with get_connection() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                """
-                UPDATE workers
-                SET cpu_usage = %s,
-                    ram_usage = %s,
-                    disk_name = %s,
-                    disk_usage = %s,
-                    net_in = %s,
-                    net_out = %s,
-                    public_ip = %s,
-                    last_updated = CURRENT_TIMESTAMP
-                WHERE worker_id = %s;
-                """,
-                (cpu_usage, ram_usage, disk_name, disk_usage, net_in, net_out, public_ip, worker_id)
-            )
-
 async def db_read_worker(worker_id):
     async with get_connection() as conn:
         async with conn.cursor() as cur:
             await cur.execute("SELECT * FROM workers WHERE worker_id = %s;", (worker_id,))
             return await cur.fetchone()
 
-async def db_worker_restart(worker_id):
-    check_query = """
-        SELECT 1
-        FROM workers
-        WHERE worker_id = %s AND has_restarted = false;
+WORKER_RESTART_QUERY = """
+    UPDATE workers
+    SET has_restarted = true
+    WHERE worker_id = %s AND has_restarted = false
+    RETURNING 1;
+"""
+
+async def db_heartbeat_round(worker_id, cpu_usage, ram_usage, disk_name, disk_usage, net_in, net_out, public_ip):
     """
-    update_query = """
-        UPDATE workers
-        SET has_restarted = true
-        WHERE worker_id = %s;
+    One /heartbeat in one round trip: consume the restart flag, read
+    worker_hold and store the metrics. Returns (restart, hold_worker).
     """
-    async with get_connection() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(check_query, (worker_id,))
-            result = await cur.fetchone()
-            if result:
-                await cur.execute(update_query, (worker_id,))
-                return True
-            else:
-                return None
+    restart, hold, _ = await run_batch([
+        (WORKER_RESTART_QUERY, (worker_id,)),
+        ("SELECT state FROM statefull WHERE state_type = 'worker_hold';", None),
+        (
+            """
+            UPDATE workers
+            SET cpu_usage = %s,
+                ram_usage = %s,
+                disk_name = %s,
+                disk_usage = %s,
+                net_in = %s,
+                net_out = %s,
+                public_ip = %s,
+                last_updated = CURRENT_TIMESTAMP
+            WHERE worker_id = %s;
+            """,
+            (cpu_usage, ram_usage, disk_name, disk_usage, net_in, net_out, public_ip, worker_id)
+        ),
+    ])
+    return (True if restart else None), (hold[0]['state'] if hold else None)
 
 async def db_restart_all_worker():
     query = """
         UPDATE workers
         SET has_restarted = false;
     """
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(query)
 
 async def db_remove_idle_workers():
     query = """
-        DELETE FROM workers
-        WHERE last_updated < NOW() - INTERVAL '1 minute';
+        DELETE FROM workers w
+        WHERE w.last_updated < NOW() - INTERVAL '1 minute'
+          -- the reaper releases these first; deleting now would orphan their tasks
+          AND NOT EXISTS (SELECT 1 FROM big_queue q WHERE q.worker_id = w.worker_id)
+          AND NOT EXISTS (SELECT 1 FROM range_leases r WHERE r.worker_id = w.worker_id);
     """
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(query)
 
@@ -130,99 +235,108 @@ async def db_authenticate_worker(worker_id, api_key):
             )
             return True if (await cur.fetchone()) else None
 
-async def db_read_all_workers():
-    async with get_connection() as conn:
+# A worker is active while its last heartbeat is under WORKER_ACTIVE_SEC old.
+# last_updated is written with CURRENT_TIMESTAMP into a TIMESTAMP column, so
+# it is compared against LOCALTIMESTAMP on the database's own clock.
+WORKER_ACTIVE_SEC = 60
+WORKER_ACTIVE_SQL = f"(last_updated >= LOCALTIMESTAMP - INTERVAL '{WORKER_ACTIVE_SEC} seconds')"
+WORKER_CARD_COLUMNS = f"""
+    worker_id,
+    cpu_usage,
+    ram_usage,
+    disk_name,
+    disk_usage,
+    net_in,
+    net_out,
+    public_ip,
+    queue,
+    EXTRACT(EPOCH FROM LOCALTIMESTAMP - last_updated) AS idle_sec,
+    {WORKER_ACTIVE_SQL} AS active
+"""
+
+# Worker listing sort orders: (SQL expression, type) keys, worker_id breaks ties
+WORKER_SORTS = {
+    "status": [(WORKER_ACTIVE_SQL, "boolean"), ("COALESCE(cpu_usage, 0)", "numeric")],
+    "cpu": [("COALESCE(cpu_usage, 0)", "numeric")],
+    "queue": [("queue", "integer")],
+}
+
+async def db_list_workers(status=None, sort="cpu", descending=True, limit=50, after=None):
+    """
+    One page of workers, keyset-paginated. `after` is the `keys` list of the
+    previous page's last row. Returns (rows, keys of the last row or None
+    when there are no more, {"active", "idle", "total"} counts).
+    """
+    keys = WORKER_SORTS[sort]
+    key_sql = [expr for expr, _ in keys] + ["worker_id"]
+    params = {"limit": limit + 1}
+    where = []
+    if status == "active":
+        where.append(WORKER_ACTIVE_SQL)
+    elif status == "idle":
+        where.append(f"NOT {WORKER_ACTIVE_SQL}")
+    if after is not None:
+        casts = [f"%(k{i})s::{kind}" for i, (_, kind) in enumerate(keys)] + [f"%(k{len(keys)})s::text"]
+        where.append(f"({', '.join(key_sql)}) {'<' if descending else '>'} ({', '.join(casts)})")
+        params.update({f"k{i}": value for i, value in enumerate(after)})
+    direction = "DESC" if descending else "ASC"
+
+    page_query = f"""
+        SELECT {WORKER_CARD_COLUMNS},
+               {', '.join(f'{expr} AS k{i}' for i, expr in enumerate(key_sql))}
+        FROM workers
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {', '.join(f'{expr} {direction}' for expr in key_sql)}
+        LIMIT %(limit)s;
+    """
+    count_query = f"""
+        SELECT COUNT(*) FILTER (WHERE {WORKER_ACTIVE_SQL}) AS active, COUNT(*) AS total
+        FROM workers;
+    """
+    rows, counts = await run_batch([(page_query, params), (count_query, None)], "admin")
+
+    next_keys = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_keys = [last[f"k{i}"] for i in range(len(key_sql))]
+    counts = counts[0]
+    return rows, next_keys, {
+        "active": counts["active"],
+        "idle": counts["total"] - counts["active"],
+        "total": counts["total"],
+    }
+
+async def db_read_worker_keys():
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
-            await cur.execute("""
-                SELECT
-                    worker_id,
-                    api_key,
-                    cpu_usage,
-                    ram_usage,
-                    disk_name,
-                    disk_usage,
-                    net_in,
-                    net_out,
-                    public_ip,
-                    created_on,
-                    last_updated,
-                    queue
-                FROM workers;
-            """)
-            rows = await cur.fetchall()
-
-            workers = []
-            for r in rows:
-                workers.append({
-                    "worker_id": r["worker_id"],
-                    "api_key": r["api_key"],
-                    "cpu_usage": float(r["cpu_usage"]) if r["cpu_usage"] is not None else None,
-                    "ram_usage": float(r["ram_usage"]) if r["ram_usage"] is not None else None,
-                    "disk_name": r["disk_name"],
-                    "disk_usage": float(r["disk_usage"]) if r["disk_usage"] is not None else None,
-                    "net_in": int(r["net_in"]) if r["net_in"] is not None else None,
-                    "net_out": int(r["net_out"]) if r["net_out"] is not None else None,
-                    "public_ip": str(r["public_ip"]) if r["public_ip"] is not None else None,
-                    "created_on": r["created_on"].isoformat() if r["created_on"] else None,
-                    "last_updated": r["last_updated"].isoformat() if r["last_updated"] else None,
-                    "queue": r["queue"] if r["queue"] else 0,
-                })
-            return workers
+            await cur.execute("SELECT worker_id, api_key FROM workers;")
+            return await cur.fetchall()
 
 # Queue Counter
-async def db_add_to_queue_count(worker_id, amount):
-    async with get_connection() as conn:
-        async with conn.cursor() as cur:
-            # Check if worker exists
-            await cur.execute("SELECT queue FROM workers WHERE worker_id = %s;", (worker_id,))
-            row = await cur.fetchone()
-            if not row:
-                return False
-
-            # Update queue by adding amount
-            await cur.execute(
-                "UPDATE workers SET queue = queue + %s WHERE worker_id = %s RETURNING queue;",
-                (amount, worker_id,)
-            )
-            
-            # Update statistics directly
-            await cur.execute(
-                "UPDATE statistics SET count = count + %s WHERE stat_type = 'queue_size'",
-                (amount,)
-            )
-            await cur.execute(
-                "UPDATE statistics SET count = count + %s WHERE stat_type = 'total_url'",
-                (amount,)
-            )
-
-            return True
-
-async def db_subtract_from_queue_count(worker_id, amount):
-    async with get_connection() as conn:
-        async with conn.cursor() as cur:
-            # Get current count
-            await cur.execute("SELECT queue FROM workers WHERE worker_id = %s;", (worker_id,))
-            row = await cur.fetchone()
-            if not row:
-                return False
-
-            current_count = row["queue"]
-            if current_count - amount < 0:
-                return False
-
-            # Update value
-            await cur.execute(
-                "UPDATE workers SET queue = queue - %s WHERE worker_id = %s RETURNING queue;",
-                (amount, worker_id)
-            )
-            
-            # Update statistics directly
-            await cur.execute(
-                "UPDATE statistics SET count = count - %s WHERE stat_type = 'queue_size'",
-                (amount,)
-            )
-
-            return True
+# Only replayed from spools written before the in-flight ledger (inflight.py).
+# Never takes a worker's queue below zero; statistics only move if it did
+SUBTRACT_FROM_QUEUE_QUERY = """
+    WITH w AS (
+        UPDATE workers SET queue = queue - %(amount)s
+        WHERE worker_id = %(worker_id)s AND queue >= %(amount)s
+        RETURNING queue
+    ), s AS (
+        UPDATE statistics SET count = count - %(amount)s
+        WHERE stat_type = 'queue_size' AND EXISTS (SELECT 1 FROM w)
+    )
+    SELECT EXISTS (SELECT 1 FROM w) AS found;
+"""
+
+async def db_subtract_from_queue_counts(worker_counts: dict):
+    """Subtract for many workers at once (one round trip)."""
+    if not worker_counts:
+        return []
+    results = await run_batch([
+        (SUBTRACT_FROM_QUEUE_QUERY, {"worker_id": wid, "amount": amount})
+        for wid, amount in worker_counts.items()
+    ])
+    return [rows[0]["found"] for rows in results]
 
 async def db_notfound_results(count: int):
     """
@@ -266,13 +380,10 @@ async def db_noredirect_results(rows: list[tuple[str, str]]):
 
     flat_values = [item for row in values for item in row]
 
-    async with get_connection() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(query, flat_values)
-            await cur.execute(
-                "UPDATE statistics SET count = count + %s WHERE stat_type = 'redirect_failed'",
-                (len(rows),)
-            )
+    await run_batch([
+        (query, flat_values),
+        ("UPDATE statistics SET count = count + %s WHERE stat_type = 'redirect_failed'", (len(rows),)),
+    ])
 
     return len(rows)
 
@@ -309,184 +420,169 @@ async def db_successful_results(rows: list[tuple]):
 
     flat_values = [item for row in values for item in row]
 
-    async with get_connection() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(query, flat_values)
-            await cur.execute(
-                "UPDATE statistics SET count = count + %s WHERE stat_type = 'scraped_pages'",
-                (len(values),)
-            )
+    await run_batch([
+        (query, flat_values),
+        ("UPDATE statistics SET count = count + %s WHERE stat_type = 'scraped_pages'", (len(values),)),
+    ])
 
-async def update_state(service_name, last_index):
+async def db_read_cursors():
+    """{service: last_index} for every generator cursor."""
     async with get_connection() as conn:
         async with conn.cursor() as cur:
-            await cur.execute("""
-                UPDATE lastcount
-                SET last_index = %s
-                WHERE service = %s;
-            """, (last_index, service_name))
+            await cur.execute("SELECT service, last_index FROM lastcount;")
+            return {row['service']: int(row['last_index']) for row in await cur.fetchall()}
 
-async def get_state(service_name):
+async def lease_range(service_name, count):
+    """
+    Atomically reserve `count` indexes of a service's keyspace and return the
+    first one. Safe across processes and nodes sharing the database.
+    """
     async with get_connection() as conn:
         async with conn.cursor() as cur:
             await cur.execute("""
-                SELECT service, last_index
-                FROM lastcount
-                WHERE service = %s;
-            """, (service_name,))
+                UPDATE lastcount
+                SET last_index = last_index + %s
+                WHERE service = %s
+                RETURNING last_index - %s AS start;
+            """, (count, service_name, count))
             res = await cur.fetchone()
-            return int(res['last_index']) if res else None
+            return int(res['start']) if res else None
 
 async def getstats():
-    async with get_connection() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT stat_type, percentage, count, change_value FROM statistics;")
-            rows = await cur.fetchall()
-            def get_value(stat_type: str, field: str, default=None):
-                for r in rows:
-                    if r.get("stat_type") == stat_type:
-                        return r.get(field) if r.get(field) is not None else default
-                return default
-            # Common lookups
-            total_urls = get_value("total_url", "count", 0)
-            total_workers = get_value("total_workers", "count", 1)
-            active_workers = get_value("active_workers", "count", 0)
-            active_percent = get_value("active_workers", "percentage", Decimal("0.00"))
-            url_not_found_percent = get_value("url_not_found", "percentage", Decimal("0.00"))
-            url_not_found_count = get_value("url_not_found", "count", 0)
-            redirect_failed_percent = get_value("redirect_failed", "percentage", Decimal("0.00"))
-            redirect_failed_count = get_value("redirect_failed", "count", 0)
-            await cur.execute("SELECT pg_database_size(current_database()) AS size;")
-            row = await cur.fetchone()
-            if not row:
-                return -1
-            size_bytes = row["size"]
-            size_mb = size_bytes / (1024 * 1024)
-            one_minute_ago = datetime.utcnow() - timedelta(minutes=1)
-            await cur.execute(
-                """
-                SELECT *
-                FROM scraped_pages
-                WHERE scraped_at >= %s;
-                """,
-                (one_minute_ago,)
-            )
-            last1 = await cur.fetchall()
-            await cur.execute("SELECT count FROM statistics WHERE stat_type = %s;", ('scraped_pages',))
-            scraped_count = (await cur.fetchone())['count']
-            await cur.execute("SELECT last_index FROM lastcount;")
-            rows_lasc = await cur.fetchall()
-            lastcount = sum(row['last_index'] for row in rows_lasc)
-            # Scraping stats
-            scraping_stats = {
-                "url_failures": {
-                    "value": float(get_value("url_failures", "percentage", Decimal("0.00"))),
-                    "count": get_value("url_failures", "count", 0),
-                    "total": total_urls,
-                    "change": float(get_value("url_failures", "change_value", Decimal("0.00"))),
-                },
-                "data_size": {
-                    "value": size_mb,
-                    "change": float(get_value("data_size", "change_value", Decimal("0.00"))),
-                },
-                "urls_count": {
-                    "value": total_urls
-                },
-                "queue_size": {
-                    "value": get_value("queue_size", "count", 0),
-                    "change": float(get_value("queue_size", "change_value", Decimal("0.00"))),
-                },
-                "lastcount": lastcount
-            }
-            # Get total workers
-            await cur.execute("SELECT COUNT(*) AS total FROM workers;")
-            total_workers = (await cur.fetchone())['total']
-            # Get active workers (last_updated within 30 seconds)
-            await cur.execute(
-                """
-                SELECT COUNT(*) AS active
-                FROM workers
-                WHERE last_updated >= NOW() - INTERVAL '30 seconds';
-                """
-            )
-            active_workers = (await cur.fetchone())['active']
-            # Stats overview
-            stats_overview = {
-                "active_workers": {
-                    "count": active_workers,
-                    "total": total_workers,
-                },
-                "url_not_found": {
-                    "value": float(url_not_found_percent),
-                    "count": url_not_found_count,
-                    "total": total_urls,
-                },
-                "scraped_pages": {
-                    "value": scraped_count,
-                    "change": len(last1),
-                },
-                "redirect_failed": {
-                    "value": float(redirect_failed_percent),
-                    "count": redirect_failed_count,
-                    "total": total_urls,
-                },
-            }
-            return {
-                "scraping_stats": scraping_stats,
-                "stats_overview": stats_overview,
-            }
+    one_minute_ago = datetime.utcnow() - timedelta(minutes=1)
+    # Every dashboard figure in one round trip
+    (
+        rows,
+        size_rows,
+        last1_rows,
+        rows_lasc,
+        total_rows,
+        active_rows,
+    ) = await run_batch([
+        ("SELECT stat_type, percentage, count, change_value FROM statistics;", None),
+        ("SELECT pg_database_size(current_database()) AS size;", None),
+        ("SELECT COUNT(*) AS recent FROM scraped_pages WHERE scraped_at >= %s;", (one_minute_ago,)),
+        ("SELECT COALESCE(SUM(last_index), 0) AS total FROM lastcount;", None),
+        ("SELECT COUNT(*) AS total FROM workers;", None),
+        (
+            """
+            SELECT COUNT(*) AS active
+            FROM workers
+            WHERE """ + WORKER_ACTIVE_SQL + """;
+            """,
+            None
+        ),
+    ], "admin")
+
+    def get_value(stat_type: str, field: str, default=None):
+        for r in rows:
+            if r.get("stat_type") == stat_type:
+                return r.get(field) if r.get(field) is not None else default
+        return default
+    # Common lookups
+    total_urls = get_value("total_url", "count", 0)
+    url_not_found_percent = get_value("url_not_found", "percentage", Decimal("0.00"))
+    url_not_found_count = get_value("url_not_found", "count", 0)
+    redirect_failed_percent = get_value("redirect_failed", "percentage", Decimal("0.00"))
+    redirect_failed_count = get_value("redirect_failed", "count", 0)
+    if not size_rows:
+        return -1
+    size_bytes = size_rows[0]["size"]
+    size_mb = size_bytes / (1024 * 1024)
+    recent_scraped = last1_rows[0]["recent"]
+    scraped_count = get_value("scraped_pages", "count", 0)
+    lastcount = int(rows_lasc[0]["total"])
+    # Scraping stats
+    scraping_stats = {
+        "url_failures": {
+            "value": float(get_value("url_failures", "percentage", Decimal("0.00"))),
+            "count": get_value("url_failures", "count", 0),
+            "total": total_urls,
+            "change": float(get_value("url_failures", "change_value", Decimal("0.00"))),
+        },
+        "data_size": {
+            "value": size_mb,
+            "change": float(get_value("data_size", "change_value", Decimal("0.00"))),
+        },
+        "urls_count": {
+            "value": total_urls
+        },
+        "queue_size": {
+            "value": get_value("queue_size", "count", 0),
+            "change": float(get_value("queue_size", "change_value", Decimal("0.00"))),
+        },
+        "lastcount": lastcount
+    }
+    total_workers = total_rows[0]['total']
+    active_workers = active_rows[0]['active']
+    # Stats overview
+    stats_overview = {
+        "active_workers": {
+            "count": active_workers,
+            "total": total_workers,
+        },
+        "url_not_found": {
+            "value": float(url_not_found_percent),
+            "count": url_not_found_count,
+            "total": total_urls,
+        },
+        "scraped_pages": {
+            "value": scraped_count,
+            "change": recent_scraped,
+        },
+        "redirect_failed": {
+            "value": float(redirect_failed_percent),
+            "count": redirect_failed_count,
+            "total": total_urls,
+        },
+    }
+    return {
+        "scraping_stats": scraping_stats,
+        "stats_overview": stats_overview,
+    }
+
+RAM_TOTAL_GB = 16    # assumed per worker
+DISK_TOTAL_GB = 250
+
+def _last_active(diff_sec):
+    if diff_sec <= 30:
+        return "just now"
+    if diff_sec < 60:
+        return f"{int(diff_sec)}s ago"
+    if diff_sec < 3600:
+        return f"{int(diff_sec//60)}m ago"
+    return f"{int(diff_sec//3600)}h ago"
 
 def process_workers(raw_workers):
+    """Worker rows straight to dashboard cards, one dict per worker."""
     worker_nodes = []
-    now = datetime.now()
+    append = worker_nodes.append
 
     for i, w in enumerate(raw_workers, start=1):
-        # Parse and force UTC timezone
-        last_updated = datetime.fromisoformat(w["last_updated"])
-
-        diff_sec = (now - last_updated).total_seconds()
-
-        # Status check (idle if >30s old)
-        status = "active" if diff_sec <= 60 else "idle"
-        # RAM (assuming 16 GB total)
-        ram_total = 16
-        ram_percent = round(w["ram_usage"])
-        ram_used = round((ram_percent / 100) * ram_total)
-
-        # Disk (assuming 250 GB total)
-        disk_total = 250
-        disk_percent = round(w["disk_usage"])
-        disk_used = round((disk_percent / 100) * disk_total)
-
-        # Last active (human readable)
-        if diff_sec <= 30:
-            last_active = "just now"
-        elif diff_sec < 60:
-            last_active = f"{int(diff_sec)}s ago"
-        elif diff_sec < 3600:
-            last_active = f"{int(diff_sec//60)}m ago"
-        else:
-            last_active = f"{int(diff_sec//3600)}h ago"
+        diff_sec = float(w["idle_sec"]) if w["idle_sec"] is not None else float("inf")
+        ram_percent = round(w["ram_usage"] or 0)
+        disk_percent = round(w["disk_usage"] or 0)
+        public_ip = w["public_ip"]
 
-        worker_nodes.append({
+        append({
             "id": w["worker_id"],
             "worker_id": w["worker_id"],
-            "status": status,
-            "ip": w["public_ip"] or f"192.168.0.{100+i}",
-            "urls_onqueue": w["queue"],
-            "cpu_usage": round(w["cpu_usage"]),
+            "status": "active" if w["active"] else "idle",
+            "ip": str(public_ip) if public_ip is not None else f"192.168.0.{100+i}",
+            "urls_onqueue": w["queue"] or 0,
+            "cpu_usage": round(w["cpu_usage"] or 0),
             "ram_usage": {
-                "used": ram_used,
-                "total": ram_total,
+                "used": round(ram_percent * RAM_TOTAL_GB / 100),
+                "total": RAM_TOTAL_GB,
                 "percent": ram_percent
             },
             "disk_name": w["disk_name"],
             "disk_usage": {
-                "used": disk_used,
-                "total": disk_total,
+                "used": round(disk_percent * DISK_TOTAL_GB / 100),
+                "total": DISK_TOTAL_GB,
                 "percent": disk_percent
             },
-            "last_active": last_active,
+            "last_active": _last_active(diff_sec),
             "network_in": w["net_in"],
             "network_out": w["net_out"]
         })
@@ -508,7 +604,7 @@ async def create_admin(username: str, password_hash: str):
     key2 = generate_key()
     key3 = generate_key()
 
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(
                 """
@@ -521,7 +617,7 @@ async def create_admin(username: str, password_hash: str):
 
 # --- READ function ---
 async def get_admin(username: str):
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(
                 "SELECT username, password_hash, key1, key2, key3 FROM scraper_admin WHERE username=%s",
@@ -548,7 +644,7 @@ async def login_logic(username: str, password: str) -> tuple[str, str, str] | No
     key2 = generate_key()
     key3 = generate_key()
 
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(
                 "UPDATE scraper_admin SET key1=%s, key2=%s, key3=%s WHERE username=%s",
@@ -559,7 +655,7 @@ async def login_logic(username: str, password: str) -> tuple[str, str, str] | No
 
 # --- LOGOUT ---
 async def logout_logic(key1: str) -> bool:
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(
                 "UPDATE scraper_admin SET key1=NULL, key2=NULL, key3=NULL WHERE key1=%s AND (key1 IS NOT NULL OR key2 IS NOT NULL OR key3 IS NOT NULL)",
@@ -570,7 +666,7 @@ async def logout_logic(key1: str) -> bool:
 # --- CHECK LOGIN ---
 async def is_logged_in_logic(keys: tuple[str, str, str]) -> bool:
     key1, key2, key3 = keys
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(
                 "SELECT key1, key2, key3 FROM scraper_admin WHERE key1=%s",
@@ -580,17 +676,43 @@ async def is_logged_in_logic(keys: tuple[str, str, str]) -> bool:
             return bool(row) and row['key1'] == key1 and row['key2'] == key2 and row['key3'] == key3  
 
 # Handling unresolved task
+# Batches this large go through COPY with task_ids taken from the sequence up
+# front; smaller ones are a single INSERT ... SELECT FROM unnest
+COPY_THRESHOLD = 1000
+
 async def batch_insert_queue(urls, worker_id=None):
+    """Enqueue `urls` in one statement; returns their task_ids in the same order."""
     if not urls:
-        return
+        return []
     assigned_at = datetime.utcnow() if worker_id else None
-    values = [(worker_id, url, assigned_at) for url in urls]
     async with get_connection() as conn:
         async with conn.cursor() as cur:
-            await cur.executemany(
-                "INSERT INTO big_queue (worker_id, unresolved_url, assigned_at) VALUES (%s, %s, %s)",
-                values,
-            )
+            if len(urls) >= COPY_THRESHOLD:
+                await cur.execute("""
+                    SELECT nextval(pg_get_serial_sequence('big_queue', 'task_id')) AS task_id
+                    FROM generate_series(1, %s);
+                """, (len(urls),))
+                task_ids = [row["task_id"] for row in await cur.fetchall()]
+                async with cur.copy(
+                    "COPY big_queue (task_id, worker_id, unresolved_url, assigned_at) FROM STDIN"
+                ) as copy:
+                    for task_id, url in zip(task_ids, urls):
+                        await copy.write_row((task_id, worker_id, url, assigned_at))
+                return task_ids
+
+            # Ids are drawn next to each url's position, so repeated urls
+            # each keep their own task_id
+            await cur.execute("""
+                WITH t AS (
+                    SELECT nextval(pg_get_serial_sequence('big_queue', 'task_id')) AS task_id, url, ord
+                    FROM unnest(%s::text[]) WITH ORDINALITY AS t(url, ord)
+                ), inserted AS (
+                    INSERT INTO big_queue (task_id, worker_id, unresolved_url, assigned_at)
+                    SELECT task_id, %s, url, %s FROM t
+                )
+                SELECT task_id FROM t ORDER BY ord;
+            """, (list(urls), worker_id, assigned_at))
+            return [row["task_id"] for row in await cur.fetchall()]
 
 async def unresolved_retrieve():
     one_hour_ago = datetime.utcnow() - timedelta(hours=1)
@@ -626,6 +748,232 @@ async def db_delete_tasks(unresolved_urls):
             await cur.execute(query, unresolved_urls)
             return cur.rowcount
 
+# Range mode: leases of (service, start_index, count) keyspace positions
+async def db_insert_range_leases(worker_id, leases):
+    """Record [(service, start_index, count)] as leased to a worker; returns the rows."""
+    if not leases:
+        return []
+    services, starts, counts = zip(*leases)
+    query = """
+        INSERT INTO range_leases (service, start_index, count, worker_id, assigned_at)
+        SELECT service, start_index, count, %s, %s
+        FROM unnest(%s::text[], %s::bigint[], %s::int[]) AS t(service, start_index, count)
+        RETURNING lease_id, service, start_index, count, watermark;
+    """
+    async with get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, (worker_id, datetime.utcnow(), list(services), list(starts), list(counts)))
+            return await cur.fetchall()
+
+async def db_reclaim_ranges(worker_id, stale_before, limit):
+    """Hand leases nobody has reported progress on since `stale_before` to another worker."""
+    query = """
+        UPDATE range_leases
+        SET worker_id = %s, assigned_at = %s
+        WHERE lease_id IN (
+            SELECT lease_id FROM range_leases
+            WHERE assigned_at < %s
+            ORDER BY assigned_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING lease_id, service, start_index, count, watermark;
+    """
+    async with get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, (worker_id, datetime.utcnow(), stale_before, limit))
+            return await cur.fetchall()
+
+async def db_range_progress(lease_id, worker_id, watermark, check=None):
+    """
+    Advance a lease's watermark (never backwards, never past its count).
+    Returns the lease with its previous watermark, or None if the worker
+    does not hold it. A finished lease is deleted. `check(lease, watermark)`
+    runs while the lease is locked, before anything is written; whatever it
+    raises leaves the lease as it was.
+    """
+    async with get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                SELECT lease_id, service, start_index, count, watermark FROM range_leases
+                WHERE lease_id = %s AND worker_id = %s
+                FOR UPDATE;
+            """, (lease_id, worker_id))
+            lease = await cur.fetchone()
+            if lease is None:
+                return None
+            advanced = min(lease["count"], max(lease["watermark"], watermark))
+            if check is not None:
+                check(lease, advanced)
+            if advanced >= lease["count"]:
+                await cur.execute("DELETE FROM range_leases WHERE lease_id = %s;", (lease_id,))
+            else:
+                await cur.execute(
+                    "UPDATE range_leases SET watermark = %s, assigned_at = %s WHERE lease_id = %s;",
+                    (advanced, datetime.utcnow(), lease_id),
+                )
+            return {**lease, "watermark": advanced, "previous": lease["watermark"]}
+
+async def db_delete_task_ids(task_ids):
+    if not task_ids:
+        return 0
+    async with get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("DELETE FROM big_queue WHERE task_id = ANY(%s);", (list(task_ids),))
+            return cur.rowcount
+
+# Stale-worker reaper: one statement per round so the released tasks and
+# the counters they were charged to can never disagree. Only workers that
+# still hold something are picked, oldest heartbeat first, so a long tail of
+# dead-and-empty rows doesn't starve the rest.
+REAP_DEAD_WORKERS_QUERY = """
+    WITH dead AS (
+        SELECT w.worker_id, w.queue FROM workers w
+        WHERE w.last_updated < LOCALTIMESTAMP - make_interval(secs => %(dead_after)s)
+          AND (EXISTS (SELECT 1 FROM big_queue q WHERE q.worker_id = w.worker_id)
+               OR EXISTS (SELECT 1 FROM range_leases r WHERE r.worker_id = w.worker_id))
+        ORDER BY w.last_updated
+        LIMIT %(workers)s
+        FOR UPDATE SKIP LOCKED
+    ), picked AS (
+        SELECT q.task_id, q.worker_id FROM big_queue q
+        WHERE q.worker_id IN (SELECT worker_id FROM dead)
+        LIMIT %(tasks)s
+        FOR UPDATE SKIP LOCKED
+    ), released AS (
+        -- '-infinity' also puts them in reach of unresolved_retrieve
+        UPDATE big_queue b SET worker_id = NULL, assigned_at = '-infinity'
+        FROM picked
+        WHERE b.task_id = picked.task_id
+        RETURNING b.task_id, picked.worker_id AS previous
+    ), leases AS (
+        -- and these in reach of db_reclaim_ranges
+        UPDATE range_leases r SET worker_id = NULL, assigned_at = '-infinity'
+        FROM dead
+        WHERE r.worker_id = dead.worker_id
+        RETURNING dead.worker_id AS previous, r.count - r.watermark AS remaining
+    ), per_worker AS (
+        SELECT d.worker_id, LEAST(d.queue, t.amount) AS amount
+        FROM dead d
+        JOIN (
+            SELECT previous, SUM(n) AS amount FROM (
+                SELECT previous, 1 AS n FROM released
+                UNION ALL
+                SELECT previous, remaining FROM leases
+            ) u GROUP BY previous
+        ) t ON t.previous = d.worker_id
+    ), fix_workers AS (
+        UPDATE workers SET queue = workers.queue - p.amount
+        FROM per_worker p
+        WHERE workers.worker_id = p.worker_id
+    ), fix_stats AS (
+        UPDATE statistics SET count = count - (SELECT COALESCE(SUM(amount), 0) FROM per_worker)
+        WHERE stat_type = 'queue_size'
+    )
+    SELECT
+        (SELECT COUNT(*) FROM dead) AS workers,
+        (SELECT COUNT(*) FROM leases) AS leases,
+        (SELECT COALESCE(array_agg(DISTINCT worker_id), '{}') FROM dead) AS worker_ids,
+        (SELECT COUNT(*) FROM released) AS tasks;
+"""
+
+async def db_reap_dead_workers(dead_after_sec, max_workers, max_tasks):
+    """
+    Release up to `max_tasks` big_queue rows and all range leases of up to
+    `max_workers` workers silent for `dead_after_sec`, and take them off the
+    workers' and the global queue counts. Returns the number of workers,
+    released tasks and leases, and the reaped worker_ids.
+    """
+    async with get_connection("admin") as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(REAP_DEAD_WORKERS_QUERY, {
+                "dead_after": dead_after_sec,
+                "workers": max_workers,
+                "tasks": max_tasks,
+            })
+            return await cur.fetchone()
+
+# Released rows are claimed straight from big_queue, so any process can hand
+# them out and none are lost with the process that reaped them
+CLAIM_RELEASED_QUERY = """
+    UPDATE big_queue SET worker_id = %s, assigned_at = %s
+    WHERE task_id IN (
+        SELECT task_id FROM big_queue
+        WHERE worker_id IS NULL AND assigned_at = '-infinity'
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING task_id, unresolved_url;
+"""
+
+async def db_claim_released(worker_id, limit):
+    """Assign up to `limit` rows released by the reaper to a worker: [{task_id, unresolved_url}]."""
+    if limit <= 0:
+        return []
+    async with get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(CLAIM_RELEASED_QUERY, (worker_id, datetime.utcnow(), limit))
+            return await cur.fetchall()
+
+async def db_unclaim_released(task_ids, worker_id):
+    """Put claimed rows the worker did not get back into the released pool."""
+    if not task_ids:
+        return 0
+    query = """
+        UPDATE big_queue SET worker_id = NULL, assigned_at = '-infinity'
+        WHERE task_id = ANY(%s) AND worker_id = %s;
+    """
+    async with get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, (list(task_ids), worker_id))
+            return cur.rowcount
+
+# What every worker holds according to big_queue and range_leases; written
+# over workers.queue and statistics.queue_size, which are otherwise no longer
+# maintained per task (see inflight.py)
+RECONCILE_QUEUE_COUNTS_QUERY = """
+    WITH held AS (
+        SELECT worker_id, SUM(n)::bigint AS n FROM (
+            SELECT worker_id, COUNT(*) AS n FROM big_queue
+            WHERE worker_id IS NOT NULL GROUP BY worker_id
+            UNION ALL
+            SELECT worker_id, SUM(count - watermark) FROM range_leases
+            WHERE worker_id IS NOT NULL GROUP BY worker_id
+        ) t GROUP BY worker_id
+    ), fix_workers AS (
+        UPDATE workers w SET queue = COALESCE(h.n, 0)
+        FROM workers cur LEFT JOIN held h ON h.worker_id = cur.worker_id
+        WHERE w.worker_id = cur.worker_id AND w.queue IS DISTINCT FROM COALESCE(h.n, 0)
+    ), fix_stats AS (
+        UPDATE statistics SET count = (SELECT COALESCE(SUM(n), 0) FROM held)
+        WHERE stat_type = 'queue_size'
+    )
+    SELECT worker_id, n FROM held;
+"""
+
+async def db_reconcile_queue_counts():
+    """{worker_id: outstanding tasks}, after correcting the stored counters to match."""
+    async with get_connection("admin") as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(RECONCILE_QUEUE_COUNTS_QUERY)
+            return {row["worker_id"]: row["n"] for row in await cur.fetchall()}
+
+async def db_iter_resolved_urls(chunk_size=10000):
+    """
+    Stream every unresolved_url that has a final outcome, chunk by chunk,
+    through a server-side cursor so the whole table never sits in memory.
+    """
+    async with get_connection("admin") as conn:
+        for table in ("scraped_pages", "noredirect"):
+            async with conn.transaction():
+                async with conn.cursor(name=f"resolved_{table}") as cur:
+                    await cur.execute(f"SELECT unresolved_url FROM {table};")
+                    while True:
+                        rows = await cur.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        yield [row["unresolved_url"] for row in rows]
+
 
 async def update_hold_worker(condition):
     query = """
@@ -634,70 +982,147 @@ async def update_hold_worker(condition):
         WHERE state_type = 'worker_hold';
     """
 
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(query, (condition,))
 
-async def read_hold_worker():
+async def update_hold_queue(condition):
     query = """
-        SELECT state
+        UPDATE statefull
+        SET state = %s
+        WHERE state_type = 'queue_hold';
+    """
+
+    async with get_connection("admin") as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, (condition,))
+
+async def update_delay(delay):
+    query = """
+        UPDATE statefull
+        SET value = %s
+        WHERE state_type = 'delay';
+    """
+
+    async with get_connection("admin") as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, (delay,))
+
+async def read_control_flags():
+    """worker_hold, queue_hold and delay in one query."""
+    query = """
+        SELECT state_type, state, value
         FROM statefull
-        WHERE state_type = 'worker_hold';
+        WHERE state_type IN ('worker_hold', 'queue_hold', 'delay');
     """
 
     async with get_connection() as conn:
         async with conn.cursor() as cur:
             await cur.execute(query)
-            result = await cur.fetchone()
-            return result['state'] if result else None
+            rows = {row['state_type']: row for row in await cur.fetchall()}
+            return {
+                "worker_hold": rows['worker_hold']['state'] if 'worker_hold' in rows else None,
+                "queue_hold": rows['queue_hold']['state'] if 'queue_hold' in rows else None,
+                "delay": rows['delay']['value'] if 'delay' in rows else None,
+            }
 
-async def update_hold_queue(condition):
+async def read_service_weights():
     query = """
-        UPDATE statefull
-        SET state = %s
-        WHERE state_type = 'queue_hold';
+        SELECT state_type, value
+        FROM statefull
+        WHERE left(state_type, 7) = 'weight_';
     """
 
     async with get_connection() as conn:
         async with conn.cursor() as cur:
-            await cur.execute(query, (condition,))
+            await cur.execute(query)
+            rows = await cur.fetchall()
+            return {row['state_type'][len('weight_'):]: row['value'] for row in rows}
 
-async def read_hold_queue():
+async def update_service_setting(prefix, service, value):
+    """Store a per-service value as statefull row `{prefix}_{service}` (weight, rate)."""
     query = """
-        SELECT state
+        INSERT INTO statefull (state_type, state, value)
+        VALUES (%s, true, %s)
+        ON CONFLICT (state_type) DO UPDATE SET value = EXCLUDED.value;
+    """
+
+    async with get_connection("admin") as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, (f"{prefix}_{service}", value))
+
+async def read_service_rate_limits():
+    query = """
+        SELECT state_type, value
         FROM statefull
-        WHERE state_type = 'queue_hold';
+        WHERE left(state_type, 5) = 'rate_';
     """
 
     async with get_connection() as conn:
         async with conn.cursor() as cur:
             await cur.execute(query)
-            result = await cur.fetchone()
-            return result['state'] if result else None
+            rows = await cur.fetchall()
+            return {row['state_type'][len('rate_'):]: row['value'] for row in rows}
 
-async def update_delay(delay):
+async def update_adaptive_schedule(condition):
     query = """
         UPDATE statefull
-        SET value = %s
-        WHERE state_type = 'delay';
+        SET state = %s
+        WHERE state_type = 'adaptive_schedule';
     """
 
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
-            await cur.execute(query, (delay,))
+            await cur.execute(query, (condition,))
 
-async def read_delay():
+async def read_adaptive_schedule():
     query = """
-        SELECT value
+        SELECT state
         FROM statefull
-        WHERE state_type = 'delay';
+        WHERE state_type = 'adaptive_schedule';
     """
 
     async with get_connection() as conn:
         async with conn.cursor() as cur:
             await cur.execute(query)
             result = await cur.fetchone()
-            return result['value'] if result else None
+            return result['state'] if result else None
+
+# Server nodes / cross-process signalling
+async def open_listen_connection():
+    return await psycopg.AsyncConnection.connect(DB_LISTEN_URL, autocommit=True, row_factory=dict_row)
+
+async def db_notify(channel, payload):
+    async with get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT pg_notify(%s, %s);", (channel, payload))
+
+async def db_node_heartbeat(node_id, timeout_sec):
+    """Mark this server process alive and return how many are alive in total."""
+    async with get_connection("admin") as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                INSERT INTO server_nodes (node_id, last_seen)
+                VALUES (%s, CURRENT_TIMESTAMP)
+                ON CONFLICT (node_id) DO UPDATE SET last_seen = CURRENT_TIMESTAMP;
+                """,
+                (node_id,)
+            )
+            await cur.execute(
+                """
+                SELECT COUNT(*) AS live
+                FROM server_nodes
+                WHERE last_seen >= CURRENT_TIMESTAMP - make_interval(secs => %s);
+                """,
+                (timeout_sec,)
+            )
+            return (await cur.fetchone())['live']
+
+async def db_remove_node(node_id):
+    async with get_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("DELETE FROM server_nodes WHERE node_id = %s;", (node_id,))
 
 async def revoke_all_admin_cookie():
     query = """
@@ -707,13 +1132,13 @@ async def revoke_all_admin_cookie():
             key3 = 'revoked_waiting_for_login';
     """
 
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(query)
 
 async def clear_workers_db():
     query = "DELETE FROM workers;"
 
-    async with get_connection() as conn:
+    async with get_connection("admin") as conn:
         async with conn.cursor() as cur:
             await cur.execute(query)
\ No newline at end of file
@@ -3,6 +3,21 @@ from db import *
 
 one_chunk = 60
 
+# Service name (as stored in lastcount) -> URL prefix
+SERVICES = {
+    "bitly": "https://bit.ly/",
+    "sid": "https://s.id/",
+    "shorturl": "https://shorturl.at/",
+    "tinycc": "https://tiny.cc/",
+    "shorturlgg": "https://shorturl.gg/",
+}
+
+def split_service(url):
+    for service, prefix in SERVICES.items():
+        if url.startswith(prefix):
+            return service, url[len(prefix):]
+    return None, url
+
 bitly_allowed = [
     'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 
     'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r', 's', 't', 
@@ -54,118 +69,144 @@ shorturlgg_allowed = [
 ]
 
 
-async def generate_bitly():
-    pending = await unresolved_retrieve()
-    if pending != None:
-        return pending
-    last_index = await get_state('bitly')
-    current_index = last_index
-    result = []
-
-    for length in range(1, 25):
-        combinations = itertools.product(bitly_allowed, repeat=length)
-
-        # Slice only the remaining needed items
-        for combo in itertools.islice(combinations, current_index, current_index + one_chunk - len(result)):
-            result.append(''.join(combo))
+# Service name -> (alphabet, code lengths to enumerate)
+GENERATORS = {
+    "bitly": (bitly_allowed, range(1, 25)),
+    "sid": (sid_allowed, range(1, 48)),
+    "shorturl": (shorturl_allowed, range(5, 22)),
+    "tinycc": (tinycc_allowed, range(1, 22)),
+    "shorturlgg": (shorturlgg_allowed, range(1, 22)),
+}
+
+
+def keyspace_size(service):
+    allowed, lengths = GENERATORS[service]
+    return sum(len(allowed) ** length for length in lengths)
+
+
+def locate(service, index):
+    """
+    Map a position in a service's keyspace (all codes of the shortest
+    length, then the next length, each in itertools.product order) to
+    (length, offset within that length). None past the end of the keyspace.
+    """
+    allowed, lengths = GENERATORS[service]
+    base = len(allowed)
+    for length in lengths:
+        size = base ** length
+        if index < size:
+            return length, index
+        index -= size
+    return None
+
+def from_legacy_index(service, last_index):
+    """
+    The keyspace position for a lastcount cursor written before positions
+    spanned all code lengths, when it was an offset into every length alike
+    (in effect the shortest one with more than `last_index` codes). Shorter
+    lengths were used up by then; codes of longer lengths below that offset
+    come around again and are mostly dropped by the bloom filter.
+    """
+    allowed, lengths = GENERATORS[service]
+    base = len(allowed)
+    skipped = 0
+    for length in lengths:
+        size = base ** length
+        if last_index < size:
+            return skipped + last_index
+        skipped += size
+    return skipped
+
+def index_of(service, code):
+    """The keyspace position of `code` (the inverse of locate); None if it isn't in the keyspace."""
+    allowed, lengths = GENERATORS[service]
+    if len(code) not in lengths:
+        return None
+    base = len(allowed)
+    digits = {char: digit for digit, char in enumerate(allowed)}
+    offset = 0
+    for char in code:
+        digit = digits.get(char)
+        if digit is None:
+            return None
+        offset = offset * base + digit
+    return sum(base ** length for length in lengths if length < len(code)) + offset
+
+
+# Codes are built in blocks: the last SUFFIX_DIGITS characters come from a
+# precomputed table of every suffix, so one block of up to base**SUFFIX_DIGITS
+# URLs is a single pass of `head + suffix` over a table slice, with no
+# per-code digit work.
+SUFFIX_DIGITS = 2
+_suffix_tables: dict[tuple, list] = {}
+
+
+def _suffixes(allowed, digits):
+    """All codes of length `digits` in itertools.product order (cached)."""
+    key = (tuple(allowed), digits)
+    table = _suffix_tables.get(key)
+    if table is None:
+        table = _suffix_tables[key] = [''.join(combo) for combo in itertools.product(allowed, repeat=digits)]
+    return table
+
+
+def _code(allowed, length, offset):
+    """The code at `offset` among codes of `length`."""
+    base = len(allowed)
+    chars = [''] * length
+    for i in range(length - 1, -1, -1):
+        offset, digit = divmod(offset, base)
+        chars[i] = allowed[digit]
+    return ''.join(chars)
+
+
+def materialize(service, start, count, prefix=''):
+    """`prefix` + code for keyspace positions start .. start + count - 1."""
+    allowed, lengths = GENERATORS[service]
+    position = locate(service, start)
+    if position is None or count <= 0:
+        return []
+    length, offset = position
+    base = len(allowed)
 
-        if len(result) >= one_chunk:
-            break
-
-    current_index += len(result)
-    await update_state('bitly', current_index)  # Update DB once
-    result = [f"https://bit.ly/{item}" for item in result]
-    return result
-
-
-async def generate_sid():
-    pending = await unresolved_retrieve()
-    if pending != None:
-        return pending
-    last_index = await get_state('sid')
-    current_index = last_index
     result = []
-
-    for length in range(1, 48):
-        combinations = itertools.product(sid_allowed, repeat=length)
-
-        for combo in itertools.islice(combinations, current_index, current_index + one_chunk - len(result)):
-            result.append(''.join(combo))
-
-        if len(result) >= one_chunk:
+    remaining = count
+    while remaining > 0:
+        tail_digits = min(length, SUFFIX_DIGITS)
+        table = _suffixes(allowed, tail_digits)
+        head_index, tail = divmod(offset, len(table))
+        heads = base ** (length - tail_digits)
+        while remaining > 0 and head_index < heads:
+            head = prefix + _code(allowed, length - tail_digits, head_index)
+            block = table[tail:tail + remaining]
+            result += [head + suffix for suffix in block]
+            remaining -= len(block)
+            head_index += 1
+            tail = 0
+        # Rolled over: continue with the first code of the next length
+        length += 1
+        offset = 0
+        if length not in lengths:
             break
-
-    current_index += len(result)
-    await update_state('sid', current_index)  # Update DB once
-    result = [f"https://s.id/{item}" for item in result]
     return result
 
-async def generate_shorturl():
-    pending = await unresolved_retrieve()
-    if pending != None:
-        return pending
-    last_index = await get_state('shorturl')
-    current_index = last_index
-    result = []
-
-    # For lengths from 1 to 10
-    for length in range(5, 22):
-        combinations = itertools.product(shorturl_allowed, repeat=length)
-        
-        # Slice only the block we need
-        for combo in itertools.islice(combinations, current_index, current_index + one_chunk - len(result)):
-            result.append(''.join(combo))
-       
-    current_index += len(result)  # Update the index after generating all items
-    await update_state('shorturl', current_index)  # Update DB once
 
-    result = [f"https://shorturl.at/{item}" for item in result]
+def enumerate_codes(service, start, count):
+    """Codes at keyspace positions start .. start + count - 1."""
+    return materialize(service, start, count)
 
-    return result
 
-async def generate_tinycc():
-    pending = await unresolved_retrieve()
-    if pending != None:
-        return pending
-    last_index = await get_state('tinycc')
-    current_index = last_index
-    result = []
+async def generate_service(service, count=one_chunk):
+    """
+    Take the next `count` codes for a service from its lastcount cursor
+    and return them as full URLs.
+    """
+    if count <= 0:
+        return []
+    # Lease the range up front so concurrent /tasks calls never overlap
+    current_index = await lease_range(service, count)
+    if current_index is None:
+        return []
 
-    # For lengths from 1 to 10
-    for length in range(1, 22):
-        combinations = itertools.product(tinycc_allowed, repeat=length)
-        
-        # Slice only the block we need
-        for combo in itertools.islice(combinations, current_index, current_index + one_chunk - len(result)):
-            result.append(''.join(combo))
-       
-    current_index += len(result)  # Update the index after generating all items
-    await update_state('tinycc', current_index)  # Update DB once
-
-    result = [f"https://tiny.cc/{item}" for item in result]
-
-    return result
-
-async def generate_shorturlgg():
-    pending = await unresolved_retrieve()
-    if pending != None:
-        return pending
-    last_index = await get_state('shorturlgg')
-    current_index = last_index
-    result = []
-
-    # For lengths from 1 to 10
-    for length in range(1, 22):
-        combinations = itertools.product(shorturlgg_allowed, repeat=length)
-        
-        # Slice only the block we need
-        for combo in itertools.islice(combinations, current_index, current_index + one_chunk - len(result)):
-            result.append(''.join(combo))
-       
-    current_index += len(result)  # Update the index after generating all items
-    await update_state('shorturlgg', current_index)  # Update DB once
-
-    result = [f"https://shorturl.gg/{item}" for item in result]
-
-    return result
+    return materialize(service, current_index, count, SERVICES[service])
 
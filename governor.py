@@ -0,0 +1,163 @@
+import logging
+import math
+import time
+from db import *
+from generator import SERVICES, split_service
+
+log = logging.getLogger(__name__)
+
+# Per-host politeness: every service has an issued-URLs-per-second budget
+# (token bucket). Failures are fetch errors only (FAILED_STATUSES: timeouts,
+# 429 and 5xx reported as status "error"); notfound and noredirect are
+# answers. When a service's recent error ratio closes more than SPIKE_SHARE
+# of the gap between its long-run baseline and 100%, and that excess is both
+# SPIKE_Z standard deviations above the baseline and at least
+# MIN_EXTRA_FAILURES errors, the budget is halved (multiplicative decrease);
+# otherwise it creeps back towards the configured limit (additive increase).
+DEFAULT_RATE_LIMIT = 100      # URLs/sec per service, 0 = unlimited
+MAX_RATE_LIMIT = 2**31 - 1    # statefull.value is an INTEGER
+BURST_SECONDS = 10
+MIN_RATE = 1.0
+RECOVER_STEP = 0.05           # fraction of the limit regained per RECOVER_INTERVAL
+RECOVER_INTERVAL = 10
+BACKOFF_FACTOR = 0.5
+BACKOFF_COOLDOWN = 30
+SPIKE_SHARE = 0.5
+SPIKE_Z = 4.0                 # excess over the baseline, in standard deviations of the short average
+MIN_EXTRA_FAILURES = 5        # excess over the baseline, in errors within the short window
+FAILED_STATUSES = frozenset({"error"})
+MIN_OBSERVED = 200
+SHORT_ALPHA = 0.01            # ~100 results
+LONG_ALPHA = 0.0005           # ~2000 results
+
+# Budgets are fleet-wide; with several server processes each takes an equal share
+NODE_COUNT = 1
+
+
+class HostGovernor:
+    def __init__(self, limit, now=None):
+        now = time.monotonic() if now is None else now
+        self.limit = float(limit)
+        self.rate = float(limit)
+        self.tokens = self.limit * BURST_SECONDS
+        self.updated = now
+        self.last_backoff = now - BACKOFF_COOLDOWN
+        self.last_recover = now
+        self.short_fail = None
+        self.long_fail = None
+        self.observed = 0
+
+    def set_limit(self, limit):
+        self.limit = float(limit)
+        self.rate = self.limit
+
+    def _refill(self, now):
+        if self.limit <= 0:
+            return
+        if now - self.last_recover >= RECOVER_INTERVAL and self.rate < self.limit:
+            self.rate = min(self.limit, self.rate + self.limit * RECOVER_STEP)
+            self.last_recover = now
+        share = self.rate / NODE_COUNT
+        self.tokens = min(share * BURST_SECONDS, self.tokens + (now - self.updated) * share)
+        self.updated = now
+
+    def take(self, wanted, now=None):
+        """Grant up to `wanted` URLs from the budget."""
+        if self.limit <= 0:
+            return wanted
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        granted = max(0, min(wanted, int(self.tokens)))
+        self.tokens -= granted
+        return granted
+
+    def observe(self, failed, now=None, count=1):
+        now = time.monotonic() if now is None else now
+        sample = 1.0 if failed else 0.0
+        self.observed += count
+        if self.short_fail is None:
+            self.short_fail = self.long_fail = sample
+            return
+        # `count` identical samples at once
+        self.short_fail += (1 - (1 - SHORT_ALPHA) ** count) * (sample - self.short_fail)
+        self.long_fail += (1 - (1 - LONG_ALPHA) ** count) * (sample - self.long_fail)
+
+        excess = self.short_fail - self.long_fail
+        # Spread of the short average around a steady baseline (EWMA of Bernoulli samples)
+        noise = math.sqrt(self.long_fail * (1 - self.long_fail) * SHORT_ALPHA / (2 - SHORT_ALPHA))
+        spiking = (
+            self.observed >= MIN_OBSERVED
+            and excess > SPIKE_SHARE * (1 - self.long_fail)
+            and excess > SPIKE_Z * noise
+            and excess / SHORT_ALPHA >= MIN_EXTRA_FAILURES
+        )
+        if spiking and self.limit > 0 and now - self.last_backoff >= BACKOFF_COOLDOWN:
+            self.rate = max(MIN_RATE, self.rate * BACKOFF_FACTOR)
+            self.tokens = min(self.tokens, self.rate / NODE_COUNT * BURST_SECONDS)
+            self.last_backoff = now
+            self.last_recover = now
+            log.warning(
+                "Failure spike (%.2f vs %.2f), backing off to %.1f/s", self.short_fail, self.long_fail, self.rate,
+                extra={"short_fail": self.short_fail, "long_fail": self.long_fail, "rate": self.rate},
+            )
+
+
+GOVERNORS: dict[str, HostGovernor] = {service: HostGovernor(DEFAULT_RATE_LIMIT) for service in SERVICES}
+
+
+def set_node_count(count):
+    global NODE_COUNT
+    NODE_COUNT = max(1, count)
+
+async def load_rate_limits():
+    try:
+        stored = await read_service_rate_limits()
+        for service, limit in stored.items():
+            # Reloaded every few seconds: an unchanged limit keeps its backoff
+            if service in GOVERNORS and limit is not None and float(limit) != GOVERNORS[service].limit:
+                GOVERNORS[service].set_limit(limit)
+    except Exception as e:
+        log.warning("Failed to load rate limits: %s", e)
+
+async def set_rate_limits(limits: dict):
+    # Check everything before changing anything. Only whole limits: stored,
+    # 0.5 would become 0, which means unlimited
+    checked = {}
+    for service, limit in limits.items():
+        if service not in SERVICES:
+            raise ValueError(f"Unknown service: {service}")
+        limit = float(limit)
+        if not math.isfinite(limit) or not 0 <= limit <= MAX_RATE_LIMIT:
+            raise ValueError(f"Rate limit for {service} must be between 0 and {MAX_RATE_LIMIT}")
+        if not limit.is_integer():
+            raise ValueError(f"Rate limit for {service} must be a whole number of URLs/sec")
+        checked[service] = int(limit)
+    for service, limit in checked.items():
+        await update_service_setting("rate", service, limit)
+        GOVERNORS[service].set_limit(limit)
+
+def govern_allocation(allocation: dict):
+    """Cap a {service: count} allocation by each service's remaining budget."""
+    return {service: GOVERNORS[service].take(count) if count > 0 else 0 for service, count in allocation.items()}
+
+def observe_host_outcome(url, status):
+    service, _ = split_service(url)
+    governor = GOVERNORS.get(service)
+    if governor is not None:
+        governor.observe(status in FAILED_STATUSES)
+
+def observe_host_outcomes(service, status, count=1):
+    governor = GOVERNORS.get(service)
+    if governor is not None and count > 0:
+        governor.observe(status in FAILED_STATUSES, count=count)
+
+def governor_snapshot():
+    return {
+        service: {
+            "limit": g.limit,
+            "rate": round(g.rate, 2),
+            "tokens": int(g.tokens),
+            "recent_failure_ratio": round(g.short_fail, 3) if g.short_fail is not None else None,
+        }
+        for service, g in GOVERNORS.items()
+    }
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_left
+from db import db_reconcile_queue_counts
+
+log = logging.getLogger(__name__)
+
+# In-flight ledger: what each worker holds right now. Tasks with a big_queue
+# task_id are kept as two parallel arrays, task ids and issue times (oldest
+# first); work without one (backlog URLs, range leases) only as a count.
+# A /result that echoes its task_id closes the entry and gives an exact
+# issue-to-result latency. The ledger sizes batches, shows the dashboard's
+# queue column and is dropped by the reaper; every LEDGER_RECONCILE seconds
+# it is squared with big_queue / range_leases, which also writes the true
+# counts to workers.queue and statistics.queue_size and covers results that
+# went to another server process. Workers this process has issued nothing to
+# are shown with those stored counts.
+LEDGER_RECONCILE = float(os.getenv("LEDGER_RECONCILE", "15"))
+LATENCY_SAMPLES = 512
+
+
+class Holding:
+    __slots__ = ("ids", "issued", "untracked", "latencies", "next_sample")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.issued = array("d")
+        self.untracked = 0
+        self.latencies = array("d")  # ring of the last LATENCY_SAMPLES, seconds
+        self.next_sample = 0
+
+    def __len__(self):
+        return len(self.ids) + self.untracked
+
+    def drop_oldest(self, count):
+        """Forget `count` entries, uncounted ones first."""
+        untracked = min(count, self.untracked)
+        self.untracked -= untracked
+        count -= untracked
+        del self.ids[:count]
+        del self.issued[:count]
+
+    def sample(self, latency):
+        if len(self.latencies) < LATENCY_SAMPLES:
+            self.latencies.append(latency)
+        else:
+            self.latencies[self.next_sample] = latency
+            self.next_sample = (self.next_sample + 1) % LATENCY_SAMPLES
+
+
+LEDGER: dict[str, Holding] = {}
+
+
+def _holding(worker_id):
+    holding = LEDGER.get(worker_id)
+    if holding is None:
+        holding = LEDGER[worker_id] = Holding()
+    return holding
+
+def issue(worker_id, task_ids=(), untracked=0, now=None):
+    now = time.monotonic() if now is None else now
+    holding = _holding(worker_id)
+    tracked = [task_id for task_id in task_ids if task_id is not None]
+    holding.ids.extend(tracked)
+    holding.issued.extend(array("d", [now]) * len(tracked))
+    holding.untracked += untracked + len(task_ids) - len(tracked)
+
+def complete(worker_id, task_id=None, count=1, now=None):
+    """Close `count` entries, `task_id`'s first; returns its latency in seconds if it was found."""
+    holding = LEDGER.get(worker_id)
+    if holding is None:
+        return None
+    latency = None
+    if task_id is not None:
+        try:
+            i = holding.ids.index(task_id)
+        except ValueError:
+            i = None
+        if i is not None:
+            now = time.monotonic() if now is None else now
+            latency = now - holding.issued[i]
+            del holding.ids[i]
+            del holding.issued[i]
+            holding.sample(latency)
+            count -= 1
+    if count > 0:
+        holding.drop_oldest(count)
+    return latency
+
+def outstanding(worker_id, default=0):
+    holding = LEDGER.get(worker_id)
+    return len(holding) if holding is not None else default
+
+def latency_summary(worker_id):
+    holding = LEDGER.get(worker_id)
+    if holding is None or not holding.latencies:
+        return None
+    samples = sorted(holding.latencies)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 2)
+    return {"samples": len(samples), "p50": pick(0.5), "p95": pick(0.95), "max": round(samples[-1], 2)}
+
+def forget(worker_id):
+    LEDGER.pop(worker_id, None)
+
+def reconcile(held, started):
+    """
+    Bring the ledger in line with `held` ({worker_id: count}) as the DB saw
+    it at `started` (monotonic). Entries issued after that are kept as is.
+    Only ever lowers a count: rows whose delete is still in the result
+    batcher are in `held` but already closed here.
+    """
+    for worker_id, holding in LEDGER.items():
+        before = bisect_left(holding.issued, started) + holding.untracked
+        target = held.get(worker_id, 0)
+        if before > target:
+            holding.drop_oldest(before - target)
+
+async def reconcile_ledger():
+    while True:
+        try:
+            started = time.monotonic()
+            reconcile(await db_reconcile_queue_counts(), started)
+        except Exception:
+            log.exception("Reconcile failed")
+        await asyncio.sleep(LEDGER_RECONCILE)
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Drain-and-handoff shutdown. On the first SIGTERM/SIGINT the process starts
+# draining: /tasks stops handing out work and heartbeats answer "hold". After
+# DRAIN_GRACE seconds the signal is passed on to uvicorn, which stops
+# accepting connections and then runs the lifespan shutdown, where buffers
+# are flushed within DRAIN_DEADLINE. A second signal skips the grace period.
+# DRAIN_GRACE must cover at least one worker heartbeat interval (workers beat
+# every 5s), or workers never see "hold" before the server goes away; the
+# default plus DRAIN_DEADLINE stays inside a 30s termination grace period.
+DRAIN_GRACE = float(os.getenv("DRAIN_GRACE", "10"))
+DRAIN_DEADLINE = float(os.getenv("DRAIN_DEADLINE", "15"))
+
+_state = {"draining": False, "since": None}
+
+
+def is_draining():
+    return _state["draining"]
+
+def begin_drain(reason):
+    if _state["draining"]:
+        return False
+    _state["draining"] = True
+    _state["since"] = time.monotonic()
+    log.warning("Draining (%s)", reason)
+    return True
+
+def install_signal_handlers(on_drain):
+    """
+    Chain in front of the server's own SIGTERM/SIGINT handlers.
+    `on_drain` is an async callable run as soon as draining starts.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return  # e.g. under a test client; signals can only be caught on the main thread
+    loop = asyncio.get_running_loop()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            if not begin_drain(signal.Signals(signum).name):
+                previous(signum, frame)
+                return
+            loop.call_soon_threadsafe(lambda: asyncio.ensure_future(on_drain()))
+            loop.call_soon_threadsafe(loop.call_later, DRAIN_GRACE, previous, signum, frame)
+
+        signal.signal(sig, handler)
+
+async def cancel_tasks(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
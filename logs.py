@@ -0,0 +1,126 @@
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+# Logging. Every record goes through a QueueHandler, so the event loop only
+# pays for an enqueue; a QueueListener thread formats JSON lines and writes
+# them to LOG_FILE or stderr. Several server processes share LOG_FILE by
+# appending to it; rotate it externally (logrotate), each process reopens the
+# file once it has been moved. Levels are per logger: LOG_LEVEL for
+# everything, LOG_LEVELS to override single modules ("queueing=DEBUG,
+# psycopg=INFO"). Third-party libraries stay at WARNING unless overridden,
+# which keeps python_multipart's per-field DEBUG lines out of the log.
+# Debug output of this server's own modules can be switched on at runtime
+# with the "debug_logging" action: a sample rate, 0 switching it off again.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FILE = os.getenv("LOG_FILE", "")  # empty = stderr
+QUIET_LIBRARIES = ("python_multipart", "multipart", "psycopg", "asyncio", "httpx", "urllib3")
+APP_LOGGERS = (
+    "main", "db", "queueing", "spool", "bloom", "scheduler", "governor", "cluster",
+    "lifecycle", "reaper", "inflight", "ranges", "assets", "tracing", "auth",
+    "warmup", "longpoll", "protocol",
+)
+
+# LogRecord attributes; anything else on a record came in through extra=
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_state = {"listener": None, "debug_sample": 1.0, "levels": {}}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """Hands the listener a record it can format on its own thread."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class DebugSampler(logging.Filter):
+    """Keep DEBUG records at the current sample rate; everything else passes."""
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = _state["debug_sample"]
+        return rate >= 1 or random.random() < rate
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def setup_logging():
+    if _state["listener"] is not None:
+        return
+    if LOG_FILE:
+        target = logging.handlers.WatchedFileHandler(LOG_FILE, encoding="utf-8")
+    else:
+        target = logging.StreamHandler(sys.stderr)
+    target.setFormatter(JsonFormatter())
+
+    records = queue.SimpleQueue()
+    handler = RecordQueueHandler(records)
+    handler.addFilter(DebugSampler())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL)
+
+    for name in QUIET_LIBRARIES:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    _state["levels"] = _parse_levels(LOG_LEVELS)
+    for name, level in _state["levels"].items():
+        logging.getLogger(name).setLevel(level)
+
+    listener = logging.handlers.QueueListener(records, target, respect_handler_level=True)
+    listener.start()
+    _state["listener"] = listener
+
+def set_debug_sample(rate):
+    """Debug logging for the server's modules at `rate` (0..1); 0 restores the configured levels."""
+    rate = float(rate)
+    if not 0 <= rate <= 1:
+        raise ValueError("debug sample rate must be between 0 and 1")
+    _state["debug_sample"] = rate if rate > 0 else 1.0
+    for name in APP_LOGGERS:
+        # Below the logger's level a call returns before building a record
+        level = logging.DEBUG if rate > 0 else _state["levels"].get(name, logging.NOTSET)
+        logging.getLogger(name).setLevel(level)
+    logging.getLogger(__name__).info("Debug logging sample rate set to %s", rate)
+
+def stop_logging():
+    listener = _state["listener"]
+    if listener is not None:
+        listener.stop()  # writes out what is still queued
+        _state["listener"] = None
@@ -0,0 +1,46 @@
+import asyncio
+import time
+from tracing import record_parked
+
+# /tasks?wait=N parks here instead of returning [] while the queue is held
+# or the host budgets are spent. notify_work() wakes every parked request at
+# once; the periodic recheck covers changes made by other processes.
+LONGPOLL_MAX_WAIT = 60
+LONGPOLL_MAX_PARKED = 500
+LONGPOLL_RECHECK = 5
+
+_work_available = asyncio.Condition()
+PARKED = 0
+
+
+async def notify_work():
+    async with _work_available:
+        _work_available.notify_all()
+
+async def park_for_work(deadline):
+    """
+    Wait until notify_work(), the recheck interval, or `deadline` (monotonic).
+    Returns False when the caller should give up and answer with no work.
+    """
+    global PARKED
+    remaining = deadline - time.monotonic()
+    if remaining <= 0 or PARKED >= LONGPOLL_MAX_PARKED:
+        return False
+
+    PARKED += 1
+    started = time.monotonic()
+    try:
+        async with _work_available:
+            await asyncio.wait_for(_work_available.wait(), min(remaining, LONGPOLL_RECHECK))
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        PARKED -= 1
+        record_parked((time.monotonic() - started) * 1000)
+    return time.monotonic() < deadline
+
+def parse_wait(value):
+    try:
+        return max(0.0, min(float(value), LONGPOLL_MAX_WAIT))
+    except (TypeError, ValueError):
+        return 0.0
@@ -1,10 +1,10 @@
 import json
 import asyncio
-import random
+import logging
+import base64
+from decimal import Decimal
 from fastapi import (
     FastAPI,
-    WebSocket,
-    WebSocketDisconnect,
     Depends,
     Header,
     Request,
@@ -13,59 +13,162 @@ from fastapi import (
     status
 )
 
-from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
+from starlette.middleware.gzip import GZipMiddleware
 from typing import Optional
 from db import *
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timedelta
 import time
 import os
 from auth import *
 from generator import *
 from queueing import *
+from queueing import _stop_event
+from bloom import *
+from scheduler import *
+from governor import *
+from longpoll import *
+from cluster import *
+from lifecycle import *
+from tracing import TraceMiddleware, slow_requests
+from ranges import LeaseError, lease_ranges, report_progress
+from reaper import reaper, take_released
+from inflight import latency_summary, outstanding, reconcile_ledger
+from assets import build_pages, build_static, page_response, static_response
+from protocol import (
+    FastJSONResponse, encode, is_text, negotiate, parse_heartbeat, read_body, tasks_response, tasks_with_ids_response,
+)
+from logs import set_debug_sample, setup_logging, stop_logging
+from warmup import CONTROL, control_refresher, health, is_ready, load_control_flags, mark_ready, warm_up
 from contextlib import asynccontextmanager
 import asyncio
 
+log = logging.getLogger(__name__)
+
+
+
+
+
+async def startup(app):
+    # Log records go through a queue to a writer thread from here on
+    setup_logging()
 
+    # Open DB pools first, with their min_size connections up
+    await open_pools(wait=True)
+    await load_schedule()
+    await load_rate_limits()
 
+    # Credentials, control flags and generator tables before the first /tasks
+    await warm_up()
 
+    # Dashboard assets: fingerprint and precompress static/, render the pages
+    build_static()
+    build_pages(templates, ("index.html", "login.html"))
 
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="static"), name="static")
+    # Resolved-code filters: snapshot now, DB rebuild in the background
+    load_snapshots()
+    app.state.bloom_task = asyncio.create_task(resolved_filter_worker())
 
-@app.on_event("startup")
-async def startup():
-    # Init DB pool first
-    init_pool()
+    # Results left in the spool by the previous run go in before anything new
+    spool.open()
+    await replay_spool()
 
     # Start background workers
-    global _refresh_task
-    _refresh_task = [asyncio.create_task(queue_worker()) for _ in range(1)]
-    app.state.refresh_task = asyncio.create_task(refresh_workers())
-
-
-@app.on_event("shutdown")
-async def shutdown():
-    # Gracefully stop workers
-    for _ in app.state.workers:
-        await queue.put(None)  # poison pill for each worker
-    await queue.join()
-    await asyncio.gather(*app.state.workers, return_exceptions=True)
+    app.state.workers = [asyncio.create_task(queue_worker()) for _ in range(1)]
+    app.state.refresh_task = asyncio.create_task(refresh_workers(on_refresh=prune_workers))
+    app.state.reaper_task = asyncio.create_task(reaper())
+    app.state.ledger_task = asyncio.create_task(reconcile_ledger())
+    app.state.control_task = asyncio.create_task(control_refresher())
+
+    # Cross-process coordination
+    subscribe("actions", reload_shared_state)
+    subscribe("sessions", drop_sessions)
+    subscribe("logging", apply_debug_sample)
+    app.state.cluster_tasks = [
+        asyncio.create_task(cluster_listener()),
+        asyncio.create_task(node_heartbeat(on_change=set_node_count)),
+    ]
+
+    # SIGTERM: stop issuing tasks and hold workers before the server stops
+    install_signal_handlers(on_drain=notify_work)
+    mark_ready()
+
+
+async def reload_shared_state(payload):
+    await load_schedule()
+    await load_rate_limits()
+    await load_control_flags()
+    await notify_work()
+
+
+async def apply_debug_sample(payload):
+    set_debug_sample(payload)
+
+
+async def shutdown(app):
+    begin_drain("shutdown")
+    await notify_work()  # release long-polling /tasks
+    flushed_before = BATCH_STATS["flushed"]
+    started = time.monotonic()
+
+    # Flush the result batcher within the deadline; anything left stays in the spool
     _stop_event.set()
-    if _refresh_task:
-        await _refresh_task
-    # Close DB pool
-    if pool is not None:
-        await pool.close()
+    async def stop_batcher():
+        for _ in app.state.workers:
+            await queue.put(None)  # poison pill for each worker
+        await asyncio.gather(*app.state.workers, return_exceptions=True)
+    try:
+        await asyncio.wait_for(stop_batcher(), DRAIN_DEADLINE)
+    except asyncio.TimeoutError:
+        log.warning("Batcher did not finish within %ss, leaving the rest in the spool", DRAIN_DEADLINE)
+        await cancel_tasks(app.state.workers)
+    left_over = queue.qsize()
+    spool.close()
+
+    await cancel_tasks([
+        app.state.refresh_task,
+        app.state.reaper_task,
+        app.state.ledger_task,
+        app.state.control_task,
+        app.state.bloom_task,
+        *app.state.cluster_tasks,
+    ])
+    save_snapshots()
+    await leave_cluster()
+
+    # Close DB pools
+    await close_pools()
+
+    flushed = BATCH_STATS["flushed"] - flushed_before
+    log.info(
+        "Shutdown in %.2fs: flushed %d events, %d left in spool", time.monotonic() - started, flushed, left_over,
+        extra={"flushed": flushed, "left_in_spool": left_over},
+    )
+    stop_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup(app)
+    yield
+    await shutdown(app)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(TraceMiddleware)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 async def get_worker_auth(
     worker_id: str = Header(..., alias="X-Worker-ID"),
     api_key: str = Header(..., alias="X-API-Key"),
 ):
     if WORKERS.get(worker_id) != api_key:
-        raise HTTPException(status_code=401, detail="Invalid worker credentials")
+        # Registered through another process, or before this one started
+        if not worker_id or not api_key or not await db_authenticate_worker(worker_id, api_key):
+            raise HTTPException(status_code=401, detail="Invalid worker credentials")
+        WORKERS[worker_id] = api_key
     return worker_id
 
 def format_bytes(value: int) -> str:
@@ -100,10 +203,24 @@ async def authorize_api(request: Request):
     return (key1, key2, key3)
 
 
-# Mount static directory for assets like CSS, JS, images
+# Static assets (JS) from the in-memory pipeline in assets.py
 templates = Jinja2Templates(directory="templates")
 templates.env.filters["format_bytes"] = format_bytes
 
+@app.get("/static/{name}")
+async def static_asset(request: Request, name: str):
+    return static_response(request, name)
+
+@app.get("/healthz")
+async def healthz():
+    """200 once warmed up, 503 while starting or draining (for load balancer checks)."""
+    state = health()
+    if is_draining():
+        state["status"] = "draining"
+    else:
+        state["status"] = "ready" if is_ready() else "warming"
+    return FastJSONResponse(state, status_code=200 if state["status"] == "ready" else 503)
+
 
 @app.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request):
@@ -114,32 +231,106 @@ async def dashboard(request: Request):
     if integrity_check(request.cookies):
         session_valid = await check_session(key1, key2, key3)
         if session_valid:
-            return templates.TemplateResponse("index.html", {"request": request})
+            return page_response(request, "index.html")
         else:
-            return templates.TemplateResponse("login.html", {"request": request})
+            return page_response(request, "login.html")
     else:
-        return templates.TemplateResponse("login.html", {"request": request})
+        return page_response(request, "login.html")
 
-@app.post("/", response_class=JSONResponse)
+@app.post("/", response_class=FastJSONResponse)
 async def dashboard_data(request: Request, auth: tuple = Depends(authorize_api)):
-    # Async DB calls
+    # Async DB calls; worker cards are paged separately through /workers
     stats = await getstats()
-    workers = await db_read_all_workers()
-    processed_workers = process_workers(workers)
-    hold_worker = await read_hold_worker()
-    hold_queue = await read_hold_queue()
-    batch_delay = await read_delay()
+    flags = await read_control_flags()
+    hold_worker = flags["worker_hold"]
+    hold_queue = flags["queue_hold"]
+    batch_delay = flags["delay"]
 
     data = {
         "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         **stats,
-        **processed_workers,
         "hold_worker": hold_worker,
         "hold_queue": hold_queue,
-        "batch_delay": batch_delay
+        "batch_delay": batch_delay,
+        "schedule": schedule_snapshot(),
+        "governor": governor_snapshot(),
+        "db_pools": pool_stats(),
+        "slow_requests": slow_requests()
     }
 
-    return JSONResponse(data)
+    return FastJSONResponse(data)
+
+
+WORKER_PAGE_MAX = 200
+
+def _encode_cursor(keys):
+    raw = json.dumps([str(k) if isinstance(k, Decimal) else k for k in keys])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _cursor_key_ok(value, kind):
+    """Whether a decoded cursor key can be cast to its sort key's SQL type."""
+    if kind == "boolean":
+        return isinstance(value, bool)
+    if isinstance(value, bool):
+        return False
+    if kind == "integer":
+        return isinstance(value, int) and -2**31 <= value < 2**31
+    if kind == "numeric" and isinstance(value, (str, int, float)):
+        try:
+            return Decimal(value).is_finite()
+        except ArithmeticError:
+            return False
+    return kind == "text" and isinstance(value, str)
+
+def _decode_cursor(cursor, sort):
+    try:
+        keys = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # The sort keys, then the worker_id tie-breaker
+    kinds = [kind for _, kind in WORKER_SORTS[sort]] + ["text"]
+    if not isinstance(keys, list) or len(keys) != len(kinds):
+        raise HTTPException(status_code=400, detail="Cursor does not match sort")
+    if not all(_cursor_key_ok(key, kind) for key, kind in zip(keys, kinds)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return keys
+
+@app.get("/workers", response_class=FastJSONResponse)
+async def list_workers(
+    request: Request,
+    status: str = "all",
+    sort: str = "cpu",
+    order: str = "desc",
+    limit: int = 48,
+    cursor: Optional[str] = None,
+    auth: tuple = Depends(authorize_api)
+):
+    """One page of worker cards: ?status=all|active|idle&sort=cpu|queue|status&order=desc|asc&cursor=..."""
+    if status not in ("all", "active", "idle"):
+        raise HTTPException(status_code=400, detail="status must be all, active or idle")
+    if sort not in WORKER_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(WORKER_SORTS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    after = _decode_cursor(cursor, sort) if cursor else None
+
+    rows, next_keys, counts = await db_list_workers(
+        status=None if status == "all" else status,
+        sort=sort,
+        descending=order == "desc",
+        limit=max(1, min(limit, WORKER_PAGE_MAX)),
+        after=after,
+    )
+    cards = process_workers(rows)
+    # This process's ledger is fresher than the reconciled queue column
+    for card in cards["worker_nodes"]:
+        card["urls_onqueue"] = outstanding(card["worker_id"], card["urls_onqueue"])
+        card["latency"] = latency_summary(card["worker_id"])
+    return FastJSONResponse({
+        **cards,
+        "next_cursor": _encode_cursor(next_keys) if next_keys else None,
+        "counts": counts,
+    })
 
 
 @app.post("/actions", response_class=JSONResponse)
@@ -163,15 +354,44 @@ async def update_actions(request: Request, auth: tuple = Depends(authorize_api))
         await update_delay(value)
     elif state_type == "revoke_all_admin_cookies":
         await revoke_all_admin_cookie()
+        await invalidate_sessions()
     elif state_type == "wipe_worker_db":
         await clear_workers_db()
     elif state_type == "restart_workers":
         await db_restart_all_worker()
     elif state_type == "cleanup_db":
         await db_remove_idle_workers()
+    elif state_type == "service_weights":
+        if not isinstance(value, dict):
+            raise HTTPException(status_code=400, detail="'value' must be a {service: weight} object")
+        try:
+            await set_weights(value)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif state_type == "adaptive_schedule":
+        await set_adaptive(value)
+    elif state_type == "debug_logging":
+        # Sample rate for DEBUG records of the server's own modules, 0 = off
+        try:
+            set_debug_sample(value)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        await publish("logging", value)
+    elif state_type == "service_rate_limits":
+        if not isinstance(value, dict):
+            raise HTTPException(status_code=400, detail="'value' must be a {service: urls_per_sec} object")
+        try:
+            await set_rate_limits(value)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
     else:
         raise HTTPException(status_code=400, detail=f"Unknown state_type: {state_type}")
 
+    # Wake long-polling /tasks requests so they see the new state, here and in other processes
+    await load_control_flags()
+    await notify_work()
+    await publish("actions", state_type)
+
     if None:
         raise HTTPException(status_code=500, detail="Failed to update state")
 
@@ -206,6 +426,8 @@ async def login(request: Request):
     # Use the provided login_logic function to validate credentials
     keys = await login_logic(username, password)
     
+    if keys:
+        await invalidate_sessions()  # the admin's previous keys are gone
     if not keys:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -262,6 +484,7 @@ async def login(request: Request):
 @app.post("/logout")
 async def logout(request: Request):
     if await logout_logic(request.cookies.get("keyone")):
+        await invalidate_sessions(request.cookies.get("keyone"))
         return RedirectResponse(url="/", status_code=303)
     else:
         raise HTTPException(status_code=401, detail="Invalid admin cookies")
@@ -300,29 +523,15 @@ async def heartbeat(request: Request):
     except HTTPException:
         return {"status": "restart", "message": "Worker auth failed"}
 
-    payload = await request.json()
-    cpu = payload["cpu_usage"]
-    ram = payload["ram_usage"]
-
-    disk_name = payload["disk_usage"]["name"]
-    disk_usage = payload["disk_usage"]["percent"]
-
-    net_in = payload["network"]["in"]
-    net_out = payload["network"]["out"]
-    public_ip = payload["public_ip"]
+    try:
+        cpu, ram, disk_name, disk_usage, net_in, net_out, public_ip = parse_heartbeat(await read_body(request))
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid heartbeat payload: {e}")
 
-    # Async DB calls
-    worker_restart = await db_worker_restart(worker_id)
-    hold_worker = await read_hold_worker()
+    record_worker_usage(worker_id, cpu, ram)
 
-    if worker_restart:
-        status = "restart"
-    elif hold_worker:
-        status = "hold"
-    else:
-        status = "continue"
-
-    await db_heartbeat_worker(
+    # Restart flag, hold flag and metrics update in one round trip
+    worker_restart, hold_worker = await db_heartbeat_round(
         worker_id,
         cpu,
         ram,
@@ -333,6 +542,13 @@ async def heartbeat(request: Request):
         public_ip
     )
 
+    if worker_restart:
+        status = "restart"
+    elif hold_worker or is_draining():
+        status = "hold"
+    else:
+        status = "continue"
+
     return {"status": status, "message": "Heartbeat updated", "worker_id": worker_id}
 
 @app.get("/tasks")
@@ -345,33 +561,101 @@ async def get_tasks(request: Request):
     except HTTPException:
         return {"status": "restart", "message": "Worker auth failed"}
 
-    # Async DB calls
-    hold_queue = await read_hold_queue()
-    if hold_queue:
-        return []
+    # Long-poll: ?wait=N parks the request instead of answering [] right away
+    deadline = time.monotonic() + parse_wait(request.query_params.get("wait"))
+    fmt = negotiate(request)
+
+    # Draining for shutdown: no new work from this process
+    if is_draining():
+        return tasks_response([], fmt)
 
-    delay = await read_delay()
+    # Control flags come from the warm-up cache, no DB round trip
+    while CONTROL["queue_hold"]:
+        if is_draining() or not await park_for_work(deadline):
+            return tasks_response([], fmt)
+
+    delay = CONTROL["delay"]
     if delay is not None:
         await asyncio.sleep(delay)
 
+    # Range mode: lease keyspace ranges instead of shipping URLs
+    if request.query_params.get("mode") == "range":
+        while True:
+            leases = await lease_ranges(worker_id, batch_size_for(worker_id))
+            if leases or is_draining() or not await park_for_work(deadline):
+                break
+        return encode(leases or {"mode": "range", "keyspace": {}, "ranges": []}, "msgpack" if fmt == "msgpack" else "json")
+
+    # Tasks released from dead workers go out first
+    released = await take_released(worker_id, batch_size_for(worker_id))
+    if released:
+        task_ids = [row["task_id"] for row in released]
+        urls = [row["unresolved_url"] for row in released]
+        record_issued(worker_id, len(released), task_ids=task_ids)
+        if request.query_params.get("with_ids") == "1":
+            return tasks_with_ids_response(task_ids, urls, fmt)
+        return tasks_response(urls, fmt)
+
     backlog = await unresolved_retrieve()
     if backlog is not None:
-        return backlog
-
-    # Call async generators concurrently
-    bitly_task = asyncio.create_task(generate_bitly())
-    sid_task = asyncio.create_task(generate_sid())
-    shorturl_task = asyncio.create_task(generate_shorturl())
-    bitly, sid, shorturl = await asyncio.gather(bitly_task, sid_task, shorturl_task)
-    generated_uid = bitly + sid + shorturl
+        backlog, resolved = filter_unresolved(backlog)
+        for url in resolved:
+            await queue_delete_job(url)
+        if backlog:
+            record_issued(worker_id, len(backlog))
+            if request.query_params.get("with_ids") == "1":
+                return tasks_with_ids_response([None] * len(backlog), backlog, fmt)
+            return tasks_response(backlog, fmt)
+
+    # Size the batch for this worker, then split it across generators by weight
+    while True:
+        generated_uid, _ = filter_unresolved(await generate_batch(batch_size_for(worker_id)))
+        if generated_uid or is_draining() or not await park_for_work(deadline):
+            break
     #generated_uid = ["https://bit.ly/a"]
 
     # Insert into queue and update DB asynchronously
-    await batch_insert_queue(generated_uid, worker_id)
-    count = len(generated_uid)
-    await db_add_to_queue_count(worker_id, count)
+    task_ids = await batch_insert_queue(generated_uid, worker_id)
+    record_issued(worker_id, len(generated_uid), task_ids=task_ids)
 
-    return generated_uid
+    # ?with_ids=1: pairs the worker can echo back as /result task_id
+    if request.query_params.get("with_ids") == "1":
+        return tasks_with_ids_response(task_ids, generated_uid, fmt)
+    return tasks_response(generated_uid, fmt)
+
+@app.post("/result/range")
+async def submit_range_result(request: Request):
+    try:
+        worker_id = await get_worker_auth(
+            worker_id=request.headers.get("X-Worker-ID"),
+            api_key=request.headers.get("X-API-Key")
+        )
+    except HTTPException:
+        return {"status": "restart", "message": "Worker auth failed"}
+
+    try:
+        payload = await request.json()
+        lease_id = int(payload["lease_id"])
+        watermark = int(payload["watermark"])
+        hits = payload.get("hits") or []
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Expected JSON with 'lease_id', 'watermark' and optional 'hits'")
+    if not isinstance(hits, list) or not all(isinstance(hit, dict) for hit in hits):
+        raise HTTPException(status_code=400, detail="'hits' must be a list of objects")
+
+    try:
+        progress = await report_progress(worker_id, lease_id, watermark, hits)
+    except LeaseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return {"status": "success", "message": "Range progress recorded", **progress}
+
+def _record_outcome(unresolved_url, status):
+    # Only for results that were accepted and queued: a rejected one must
+    # not mark its code resolved
+    mark_resolved(unresolved_url)
+    record_outcome(unresolved_url, status)
+    observe_host_outcome(unresolved_url, status)
 
 @app.post("/result")
 async def submit_result(
@@ -381,38 +665,44 @@ async def submit_result(
     resolved_url: Optional[str] = Form(None),
     title: Optional[str] = Form(None),
     short_description: Optional[str] = Form(None),
-    full_text_blob: Optional[str] = Form(None)
+    full_text_blob: Optional[str] = Form(None),
+    task_id: Optional[int] = Form(None)
 ):
     try:
         worker_id=request.headers.get("X-Worker-ID")
     except HTTPException:
         return {"status": "restart", "message": "Worker auth failed"}
 
-    # Async DB calls
-    await queue_subtract_job(worker_id, 1)
+    # Text Postgres can't store (NUL bytes) is refused before it is spooled
+    if not is_text(unresolved_url):
+        raise HTTPException(status_code=400, detail="Invalid unresolved_url")
 
-    if status == "success":
-        try:
-            await queue_delete_job(unresolved_url)
-        except:
-            pass
+    if worker_id:
+        record_completion(worker_id, task_id=task_id)
 
+    if status == "success":
         missing_fields = []
-        if not resolved_url:
+        if not is_text(resolved_url):
             missing_fields.append("resolved_url")
-        if not title:
+        if not is_text(title):
             missing_fields.append("title")
-        if not short_description:
+        if not is_text(short_description):
             missing_fields.append("short_description")
-        if not full_text_blob:
+        if not is_text(full_text_blob):
             missing_fields.append("full_text_blob")
 
         if missing_fields:
             raise HTTPException(
                 status_code=400,
-                detail=f"Missing required fields for success status: {', '.join(missing_fields)}"
+                detail=f"Missing or invalid fields for success status: {', '.join(missing_fields)}"
             )
 
+        # A rejected result keeps its task queued, so the code is reissued
+        try:
+            await queue_delete_job(unresolved_url, task_id)
+        except:
+            pass
+
         await queue_successful_result(
             worker_id,
             unresolved_url,
@@ -421,27 +711,36 @@ async def submit_result(
             short_description,
             full_text_blob
         )
+        _record_outcome(unresolved_url, status)
 
         return {"status": "success", "message": "Result processed successfully"}
 
     elif status == "noredirect":
         try:
-            await queue_delete_job(unresolved_url)
+            await queue_delete_job(unresolved_url, task_id)
         except:
             pass
         await queue_noredirect_result(worker_id, unresolved_url)
+        _record_outcome(unresolved_url, status)
         return {"status": "success", "message": "Result processed successfully"}
 
     elif status == "notfound":
         try:
-            await queue_delete_job(unresolved_url)
+            await queue_delete_job(unresolved_url, task_id)
         except:
             pass
         await queue_notfound_result()
+        _record_outcome(unresolved_url, status)
         return {"status": "success", "message": "Result processed successfully"}
 
+    elif status == "error":
+        # The fetch itself failed (timeout, 429, 5xx): nothing is known about
+        # the code, so its task stays queued; only the governor hears of it
+        observe_host_outcome(unresolved_url, status)
+        return {"status": "success", "message": "Error recorded"}
+
     else:
         raise HTTPException(
             status_code=400,
-            detail="Invalid status. Must be 'success', 'noredirect', or 'notfound'"
+            detail="Invalid status. Must be 'success', 'noredirect', 'notfound', or 'error'"
         )
\ No newline at end of file
@@ -1,4 +1,4 @@
 #!/bin/bash
 
 /home/ahnaf/.local/bin/uv sync
-/home/ahnaf/.local/bin/uv run python -m uvicorn main:app  --port 8000
+/home/ahnaf/.local/bin/uv run python -m uvicorn main:app  --port 8000 --workers ${WEB_CONCURRENCY:-1}
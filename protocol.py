@@ -0,0 +1,129 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from generator import SERVICES, split_service
+
+# Worker payload encodings. JSON stays the default; a worker opts in with
+# an Accept header (or ?format= on /tasks):
+#   application/vnd.urldrill.grouped+json  /tasks as {prefix: [codes]}
+#   application/msgpack                    the grouped form as msgpack
+# Heartbeats may be sent as msgpack (Content-Type: application/msgpack) and
+# as a flat list [cpu, ram, disk_name, disk_percent, net_in, net_out, ip].
+# Response compression (gzip) is negotiated separately via Accept-Encoding.
+try:
+    import msgpack
+except ImportError:  # optional: pip install -e ".[fast]"
+    msgpack = None
+try:
+    import orjson
+except ImportError:  # optional: pip install -e ".[fast]"
+    orjson = None
+
+GROUPED_JSON = "application/vnd.urldrill.grouped+json"
+MSGPACK = "application/msgpack"
+HEARTBEAT_FIELDS = ("cpu_usage", "ram_usage", "disk_name", "disk_percent", "net_in", "net_out", "public_ip")
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return str(obj)  # IP addresses, UUIDs
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson when it is installed, else compact
+    stdlib json. Returning one from an endpoint also skips FastAPI's
+    jsonable_encoder pass over the content.
+    """
+
+    def render(self, content):
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            check_circular=False,
+            separators=(",", ":"),
+            default=_default,
+        ).encode()
+
+
+def negotiate(request: Request):
+    """'json', 'grouped' or 'msgpack' for this request's response."""
+    fmt = request.query_params.get("format")
+    if fmt in ("json", "grouped"):
+        return fmt
+    if fmt == "msgpack":
+        return "msgpack" if msgpack is not None else "grouped"
+    accept = request.headers.get("accept", "")
+    if MSGPACK in accept and msgpack is not None:
+        return "msgpack"
+    if GROUPED_JSON in accept or MSGPACK in accept:
+        return "grouped"
+    return "json"
+
+def group_urls(urls):
+    """{prefix: [codes]}; URLs of no known service are grouped under ''."""
+    grouped: dict[str, list] = {}
+    prefix, codes = None, None
+    for url in urls:
+        # Batches come in runs of one service; only look up on a change
+        if not prefix or not url.startswith(prefix):
+            service, _ = split_service(url)
+            prefix = SERVICES[service] if service else ""
+            codes = grouped.setdefault(prefix, [])
+        codes.append(url[len(prefix):])
+    return grouped
+
+def ungroup_urls(grouped):
+    return [prefix + code for prefix, codes in grouped.items() for code in codes]
+
+def encode(payload, fmt):
+    if fmt == "msgpack":
+        return Response(msgpack.packb(payload), media_type=MSGPACK)
+    if fmt == "grouped":
+        return Response(json.dumps(payload, separators=(",", ":")), media_type=GROUPED_JSON)
+    return FastJSONResponse(payload)
+
+def tasks_response(urls, fmt):
+    if fmt == "json":
+        return FastJSONResponse(urls)
+    return encode(group_urls(urls), fmt)
+
+def tasks_with_ids_response(task_ids, urls, fmt):
+    """?with_ids=1: [{task_id, url}]. Pairs don't group, so grouped is sent as JSON."""
+    pairs = [{"task_id": task_id, "url": url} for task_id, url in zip(task_ids, urls)]
+    return encode(pairs, "msgpack" if fmt == "msgpack" else "json")
+
+async def read_body(request: Request):
+    """Request body as JSON, or msgpack when the worker says so."""
+    if request.headers.get("content-type", "").startswith(MSGPACK):
+        if msgpack is None:
+            raise ValueError("msgpack bodies need the msgpack package on the server")
+        return msgpack.unpackb(await request.body())
+    return await request.json()
+
+def is_text(value):
+    """A non-empty str that fits a Postgres text column (no NUL)."""
+    return isinstance(value, str) and value != "" and "\x00" not in value
+
+def parse_heartbeat(payload):
+    """Nested heartbeat object or the flat list form -> (cpu, ram, disk_name, disk_percent, net_in, net_out, ip)."""
+    if isinstance(payload, list):
+        if len(payload) != len(HEARTBEAT_FIELDS):
+            raise ValueError(f"Flat heartbeat needs {len(HEARTBEAT_FIELDS)} values: {', '.join(HEARTBEAT_FIELDS)}")
+        return tuple(payload)
+    return (
+        payload["cpu_usage"],
+        payload["ram_usage"],
+        payload["disk_usage"]["name"],
+        payload["disk_usage"]["percent"],
+        payload["network"]["in"],
+        payload["network"]["out"],
+        payload["public_ip"],
+    )
@@ -1,19 +1,40 @@
 import asyncio
+import logging
+import os
+import psycopg
 from collections import defaultdict
 from db import *
+from spool import Spool, read_segment
+
+log = logging.getLogger(__name__)
 
 queue = asyncio.Queue(maxsize=500)
+spool = Spool()
 WORKERS: dict[str, str] = {}
 _refresh_task: asyncio.Task | None = None
 _stop_event = asyncio.Event()
+BATCH_STATS = {"flushed": 0}
+FLUSH_RETRY_MIN = 1  # seconds; doubles up to FLUSH_RETRY_MAX while Postgres fails
+FLUSH_RETRY_MAX = 30
+# Errors about the data rather than the connection: retrying cannot help
+NON_RETRIABLE = (psycopg.DataError, psycopg.IntegrityError, psycopg.ProgrammingError)
 
-# ---- Producer ----
-async def queue_subtract_job(worker_id, count):
-    await queue.put(("subtract", worker_id, count))
+async def _enqueue(job):
+    await queue.put(job)
+    if spool.fd is None:
+        return
+    # Same event-loop step as the put, so a drain never sees a job that is
+    # not yet in the segment it is about to rotate out
+    spool.write(job)
+    await spool.sync()
 
 # ---- Producer: Delete ----
-async def queue_delete_job(unresolved_url):
-    await queue.put(("delete", unresolved_url))
+async def queue_delete_job(unresolved_url, task_id=None):
+    # By task_id when the worker echoed one back: a primary key lookup
+    if task_id is not None:
+        await _enqueue(("delete_id", task_id))
+    else:
+        await _enqueue(("delete", unresolved_url))
 
 
 async def queue_successful_result(
@@ -25,108 +46,226 @@ async def queue_successful_result(
     full_text_blob: str
 ):
     row = (worker_id, unresolved_url, resolved_url, title, short_description, full_text_blob)
-    await queue.put(("success", row))
+    await _enqueue(("success", row))
 
 
 # ---- Producer: NoRedirect ----
 async def queue_noredirect_result(worker_id: str, unresolved_url: str):
     row = (worker_id, unresolved_url)
-    await queue.put(("noredirect", row))
+    await _enqueue(("noredirect", row))
+
+async def queue_notfound_result(count=1):
+    await _enqueue(("notfound", count))
 
-async def queue_notfound_result():
-    await queue.put(("notfound", 1))
 
+async def load_workers():
+    rows = await db_read_worker_keys()
+    # Replace in place so every importer of WORKERS sees the refresh
+    fresh = {w["worker_id"]: w["api_key"] for w in rows}
+    WORKERS.clear()
+    WORKERS.update(fresh)
+    log.debug("Loaded %d workers into cache", len(WORKERS))
 
-async def refresh_workers():
-    global WORKERS_CACHE
+async def refresh_workers(on_refresh=None):
+    # The first load is part of the startup warm-up
     while True:
+        await asyncio.sleep(20)  # refresh every 20s
         try:
-            rows = await db_read_all_workers()
-            WORKERS_CACHE = {w["worker_id"]: w["api_key"] for w in rows}
-            print(f"[Workers Refresh] Loaded {len(WORKERS_CACHE)} workers into cache")
+            await load_workers()
+            if on_refresh is not None:
+                on_refresh(WORKERS)
         except Exception as e:
-            print(f"[Workers Refresh] Failed: {e}")
-        await asyncio.sleep(20)  # refresh every 20s
+            log.warning("Worker refresh failed: %s", e)
 # ---- Consumer ----
+def _new_batch():
+    return {
+        "worker_counts": defaultdict(int),
+        "delete_urls": [],
+        "delete_ids": [],
+        "success_rows": [],
+        "noredirect_rows": [],
+        "notfound_count": 0,
+        "jobs": 0,
+    }
+
+def _add_job(batch, job):
+    job_type, *payload = job
+    batch["jobs"] += 1
+
+    if job_type == "subtract":
+        # Only in spools from before the in-flight ledger (inflight.py)
+        worker_id, count = payload
+        batch["worker_counts"][worker_id] += count
+    elif job_type == "delete":
+        unresolved_url, = payload
+        batch["delete_urls"].append(unresolved_url)
+    elif job_type == "delete_id":
+        task_id, = payload
+        batch["delete_ids"].append(task_id)
+    elif job_type == "success":
+        row, = payload
+        batch["success_rows"].append(tuple(row))
+    elif job_type == "noredirect":
+        row, = payload
+        batch["noredirect_rows"].append(tuple(row))
+    elif job_type == "notfound":
+        count, = payload
+        batch["notfound_count"] += count
+
+async def flush_batch(batch):
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Flushing batch", extra={
+            "jobs": batch["jobs"],
+            "subtract": dict(batch["worker_counts"]),
+            "delete_urls": len(batch["delete_urls"]),
+            "delete_ids": len(batch["delete_ids"]),
+            "success": len(batch["success_rows"]),
+            "noredirect": len(batch["noredirect_rows"]),
+            "notfound": batch["notfound_count"],
+        })
+
+    # Each step commits on its own and is then cleared from the batch, so a
+    # retry after a failure only repeats the steps that did not commit
+    if batch["worker_counts"]:
+        await db_subtract_from_queue_counts(batch["worker_counts"])
+        batch["worker_counts"] = defaultdict(int)
+
+    if batch["delete_urls"]:
+        await db_delete_tasks(batch["delete_urls"])
+        batch["delete_urls"] = []
+
+    if batch["delete_ids"]:
+        await db_delete_task_ids(batch["delete_ids"])
+        batch["delete_ids"] = []
+
+    if batch["success_rows"]:
+        await db_successful_results(batch["success_rows"])
+        batch["success_rows"] = []
+
+    if batch["noredirect_rows"]:
+        await db_noredirect_results(batch["noredirect_rows"])
+        batch["noredirect_rows"] = []
+
+    if batch["notfound_count"]:
+        await db_notfound_results(batch["notfound_count"])
+        batch["notfound_count"] = 0
+
+    BATCH_STATS["flushed"] += batch["jobs"]
+
+async def replay_spool():
+    """Push jobs left in spool segments by dead processes into Postgres."""
+    for directory, segments in spool.orphaned():
+        failed = False
+        for path in segments:
+            # One bad segment must not keep the server from starting
+            try:
+                batch = _new_batch()
+                count = 0
+                for job in read_segment(path):
+                    _add_job(batch, job)
+                    count += 1
+                try:
+                    await flush_batch(batch)
+                except NON_RETRIABLE as e:
+                    log.warning("Replay of %s rejected (%s), replaying its jobs one by one", path, e)
+                    await _flush_singly(batch)
+                os.remove(path)
+                log.info("Replayed %d jobs from %s", count, path)
+            except Exception:
+                log.exception("Replay of %s failed, kept for the next start", path)
+                failed = True
+        if not failed:
+            spool.remove_orphan(directory)
+
 async def queue_worker():
     while True:
-        worker_counts = defaultdict(int)
-        delete_urls = []
-        success_rows = []
-        noredirect_rows = []
-        notfound_count = 0
+        batch = _new_batch()
 
         # Wait for at least one job
         job = await queue.get()
         if job is None:
             queue.task_done()
             break
-
-        job_type, *payload = job
-
-        if job_type == "subtract":
-            worker_id, count = payload
-            worker_counts[worker_id] += count
-        elif job_type == "delete":
-            unresolved_url, = payload
-            delete_urls.append(unresolved_url)
-        elif job_type == "success":
-            row, = payload
-            success_rows.append(row)
-        elif job_type == "noredirect":
-            row, = payload
-            noredirect_rows.append(row)
-        elif job_type == "notfound":
-            notfound_count += 1
-
+        _add_job(batch, job)
         queue.task_done()
 
-        # Drain remaining jobs
+        # Drain remaining jobs (no awaits until the spool rotates)
         while not queue.empty():
-            next_job = await queue.get()
+            next_job = queue.get_nowait()
             if next_job is None:
                 queue.task_done()
-                await queue.put(None)
+                queue.put_nowait(None)
                 break
-
-            job_type, *payload = next_job
-
-            if job_type == "subtract":
-                wid, c = payload
-                worker_counts[wid] += c
-            elif job_type == "delete":
-                unresolved_url, = payload
-                delete_urls.append(unresolved_url)
-            elif job_type == "success":
-                row, = payload
-                success_rows.append(row)
-            elif job_type == "noredirect":
-                row, = payload
-                noredirect_rows.append(row)
-
+            _add_job(batch, next_job)
             queue.task_done()
 
-        # Throttle batching
-        await asyncio.sleep(2)
+        segment = spool.rotate() if spool.fd is not None else None
 
-        # Perform DB ops with debug prints
-        if worker_counts:
-            print(f"[DEBUG] Processing subtract batch: {dict(worker_counts)}")
-            for wid, total in worker_counts.items():
-                await db_subtract_from_queue_count(wid, total)
+        # Throttle batching, unless shutting down
+        try:
+            await asyncio.wait_for(_stop_event.wait(), 2)
+        except asyncio.TimeoutError:
+            pass
 
-        if delete_urls:
-            print(f"[DEBUG] Processing delete batch: {len(delete_urls)} urls")
-            await db_delete_tasks(delete_urls)
+        if await _flush_with_retry(batch):
+            if segment:
+                await spool.release(segment)
+        else:
+            # Shutting down with Postgres still failing: the segment stays
+            # on disk and is replayed on the next start
+            log.error("Batch flush abandoned, kept %s for replay", segment[0] if segment else "nothing")
+            if segment:
+                await spool.keep(segment)
 
-        if success_rows:
-            print(f"[DEBUG] Processing success batch: {len(success_rows)} rows")
-            await db_successful_results(success_rows)
+async def _flush_with_retry(batch, split=True):
+    """
+    Flush until it succeeds; False if shutdown came first. A batch Postgres
+    rejects is flushed job by job, so one bad job can't hold up the rest
+    (with split=False the error is raised instead).
+    """
+    delay = FLUSH_RETRY_MIN
+    while True:
+        try:
+            await flush_batch(batch)
+            return True
+        except NON_RETRIABLE as e:
+            if not split:
+                raise
+            log.warning("Batch rejected (%s), flushing its jobs one by one", e)
+            return await _flush_singly(batch)
+        except Exception as e:
+            log.error("Batch flush failed, retrying in %gs: %s", delay, e)
+        if _stop_event.is_set():
+            return False
+        try:
+            await asyncio.wait_for(_stop_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        delay = min(delay * 2, FLUSH_RETRY_MAX)
 
-        if noredirect_rows:
-            print(f"[DEBUG] Processing noredirect batch: {len(noredirect_rows)} rows")
-            await db_noredirect_results(noredirect_rows)
+def _remaining_jobs(batch):
+    """The jobs of whatever part of `batch` is not flushed yet."""
+    for worker_id, count in batch["worker_counts"].items():
+        yield ("subtract", worker_id, count)
+    for url in batch["delete_urls"]:
+        yield ("delete", url)
+    for task_id in batch["delete_ids"]:
+        yield ("delete_id", task_id)
+    for row in batch["success_rows"]:
+        yield ("success", row)
+    for row in batch["noredirect_rows"]:
+        yield ("noredirect", row)
+    if batch["notfound_count"]:
+        yield ("notfound", batch["notfound_count"])
 
-        if notfound_count:
-            print(f"[DEBUG] Processing notfound batch: {notfound_count}")
-            await db_notfound_results(notfound_count)
\ No newline at end of file
+async def _flush_singly(batch):
+    for job in list(_remaining_jobs(batch)):
+        single = _new_batch()
+        _add_job(single, job)
+        try:
+            if not await _flush_with_retry(single, split=False):
+                return False
+        except NON_RETRIABLE as e:
+            log.error("Quarantined a job Postgres rejects: %s", e, extra={"job_type": job[0]})
+            spool.quarantine(job, str(e))
+    return True
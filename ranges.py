@@ -0,0 +1,139 @@
+import asyncio
+from datetime import datetime, timedelta
+from db import *
+from generator import GENERATORS, SERVICES, index_of, keyspace_size, split_service
+from scheduler import allocate_batch, record_completion, record_issued, record_outcome, record_outcomes
+from governor import govern_allocation, observe_host_outcome, observe_host_outcomes
+from bloom import mark_resolved
+from protocol import is_text
+from queueing import (
+    queue_noredirect_result,
+    queue_notfound_result,
+    queue_successful_result,
+)
+
+# Range mode (/tasks?mode=range). Instead of URL lists a worker gets leases
+# of keyspace positions (service, start, count) plus each service's alphabet
+# and lengths, enumerates the codes itself in the same order as
+# generator.materialize(), and reports only hits and a watermark: how many
+# codes from `start` are done. Nothing goes through big_queue. A lease with
+# no progress for RANGE_STALE is handed, from its watermark, to the next
+# worker asking for work.
+RANGE_STALE = timedelta(hours=1)
+RANGE_RECLAIM = 4
+HIT_FIELDS = ("resolved_url", "title", "short_description", "full_text_blob")
+
+
+class LeaseError(Exception):
+    pass
+
+
+def keyspace(services):
+    """What a worker needs to enumerate codes of `services`."""
+    out = {}
+    for service in services:
+        allowed, lengths = GENERATORS[service]
+        out[service] = {
+            "prefix": SERVICES[service],
+            "alphabet": "".join(allowed),
+            "lengths": [lengths[0], lengths[-1]],
+        }
+    return out
+
+def _describe(row):
+    return {
+        "lease_id": row["lease_id"],
+        "service": row["service"],
+        "start": row["start_index"],
+        "count": row["count"],
+        "watermark": row["watermark"],
+    }
+
+async def _lease_fresh(service, count):
+    start = await lease_range(service, count)
+    if start is None:
+        return None
+    count = min(count, keyspace_size(service) - start)
+    return (service, start, count) if count > 0 else None
+
+async def lease_ranges(worker_id, total):
+    """Stale leases first, otherwise fresh ranges split across services by weight."""
+    rows = await db_reclaim_ranges(worker_id, datetime.utcnow() - RANGE_STALE, RANGE_RECLAIM)
+    if not rows:
+        allocation = govern_allocation(allocate_batch(total))
+        leased = await asyncio.gather(*(
+            _lease_fresh(service, count) for service, count in allocation.items() if count > 0
+        ))
+        rows = await db_insert_range_leases(worker_id, [lease for lease in leased if lease])
+    if not rows:
+        return None
+
+    record_issued(worker_id, sum(row["count"] - row["watermark"] for row in rows))
+    return {
+        "mode": "range",
+        "keyspace": keyspace({row["service"] for row in rows}),
+        "ranges": [_describe(row) for row in rows],
+    }
+
+async def report_progress(worker_id, lease_id, watermark, hits):
+    """
+    Apply a range-mode report: `hits` are the success/noredirect results
+    among the codes up to `watermark`; everything else there was notfound.
+    """
+    for hit in hits:
+        # Checked before anything is acknowledged: a value Postgres can't
+        # store would otherwise sit in the spool
+        if hit.get("status") not in ("success", "noredirect") or not is_text(hit.get("unresolved_url")):
+            raise LeaseError("Each hit needs 'unresolved_url' and status 'success' or 'noredirect'")
+        if hit["status"] == "success":
+            missing = [field for field in HIT_FIELDS if not is_text(hit.get(field))]
+            if missing:
+                raise LeaseError(f"Missing or invalid fields for success status: {', '.join(missing)}")
+
+    if len({hit["unresolved_url"] for hit in hits}) < len(hits):
+        raise LeaseError("Duplicate hits")
+
+    def check(lease, advanced):
+        # Hits must be codes this report newly covers: [previous, watermark)
+        done = advanced - lease["watermark"]
+        if done <= 0:
+            return  # a retried report, nothing is applied
+        if len(hits) > done:
+            raise LeaseError(f"{len(hits)} hits for {done} codes")
+        low = lease["start_index"] + lease["watermark"]
+        for hit in hits:
+            service, code = split_service(hit["unresolved_url"])
+            index = index_of(service, code) if service == lease["service"] else None
+            if index is None or not low <= index < low + done:
+                raise LeaseError(f"{hit['unresolved_url']} is not in the reported part of lease {lease_id}")
+
+    lease = await db_range_progress(lease_id, worker_id, watermark, check)
+    if lease is None:
+        raise LeaseError(f"Lease {lease_id} is not held by this worker")
+
+    result = {
+        "lease_id": lease_id,
+        "watermark": lease["watermark"],
+        "complete": lease["watermark"] >= lease["count"],
+    }
+    done = lease["watermark"] - lease["previous"]
+    if done <= 0:
+        return result  # a retried report; its hits were applied the first time
+    record_completion(worker_id, done)
+
+    for hit in hits:
+        url = hit["unresolved_url"]
+        mark_resolved(url)
+        record_outcome(url, hit["status"])
+        observe_host_outcome(url, hit["status"])
+        if hit["status"] == "success":
+            await queue_successful_result(worker_id, url, *(hit[field] for field in HIT_FIELDS))
+        else:
+            await queue_noredirect_result(worker_id, url)
+
+    notfound = done - len(hits)
+    if notfound > 0:
+        record_outcomes(lease["service"], "notfound", notfound)
+        observe_host_outcomes(lease["service"], "notfound", notfound)
+        await queue_notfound_result(notfound)
+    return result
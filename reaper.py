@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from bloom import filter_unresolved
+from db import db_claim_released, db_reap_dead_workers, db_unclaim_released
+from generator import split_service
+from governor import govern_allocation
+from lifecycle import is_draining
+from longpoll import notify_work
+from queueing import queue_delete_job
+from scheduler import forget_worker
+
+log = logging.getLogger(__name__)
+
+# Stale-worker reaper. A worker whose last heartbeat is older than
+# WORKER_DEAD_SEC is dead: every REAP_INTERVAL seconds its big_queue rows
+# and range leases are released and its queue count taken back, at most
+# REAP_MAX_WORKERS workers and REAP_MAX_TASKS rows per round. Released rows
+# stay in big_queue (worker_id NULL, assigned_at '-infinity') and /tasks of
+# any process hands them out ahead of anything else, through the bloom
+# filter and the host governor like the rest of the work; released leases
+# go back through db_reclaim_ranges.
+WORKER_DEAD_SEC = int(os.getenv("WORKER_DEAD_SEC", "120"))
+REAP_INTERVAL = float(os.getenv("REAP_INTERVAL", "15"))
+REAP_MAX_WORKERS = int(os.getenv("REAP_MAX_WORKERS", "50"))
+REAP_MAX_TASKS = int(os.getenv("REAP_MAX_TASKS", "5000"))
+REAP_BACKOFF = 1  # seconds between rounds while there is more to reap
+
+
+async def reap_once():
+    """One bounded round; True if it hit a limit and there may be more."""
+    row = await db_reap_dead_workers(WORKER_DEAD_SEC, REAP_MAX_WORKERS, REAP_MAX_TASKS)
+    if not row["workers"]:
+        return False
+
+    for worker_id in row["worker_ids"]:
+        forget_worker(worker_id)
+    log.info(
+        "Released %d tasks and %d leases of %d dead workers", row["tasks"], row["leases"], row["workers"],
+        extra={"tasks": row["tasks"], "leases": row["leases"], "workers": row["workers"]},
+    )
+    await notify_work()
+    return row["workers"] >= REAP_MAX_WORKERS or row["tasks"] >= REAP_MAX_TASKS
+
+async def reaper():
+    while True:
+        more = False
+        try:
+            if not is_draining():
+                more = await reap_once()
+        except Exception:
+            log.exception("Reap failed")
+        await asyncio.sleep(REAP_BACKOFF if more else REAP_INTERVAL)
+
+async def take_released(worker_id, count):
+    """Up to `count` released tasks, now assigned to `worker_id`: [{task_id, unresolved_url}]."""
+    rows = await db_claim_released(worker_id, count)
+    if not rows:
+        return []
+
+    fresh, resolved = filter_unresolved([row["unresolved_url"] for row in rows])
+    resolved = set(resolved)
+    by_service = defaultdict(list)
+    for row in rows:
+        if row["unresolved_url"] in resolved:
+            await queue_delete_job(row["unresolved_url"], row["task_id"])
+        else:
+            by_service[split_service(row["unresolved_url"])[0]].append(row)
+
+    granted = govern_allocation({service: len(group) for service, group in by_service.items() if service is not None})
+    taken, returned = [], []
+    for service, group in by_service.items():
+        keep = granted.get(service, len(group))  # unknown hosts have no budget
+        taken.extend(group[:keep])
+        returned.extend(row["task_id"] for row in group[keep:])
+    # Over budget: back into the pool for a later request
+    await db_unclaim_released(returned, worker_id)
+    return taken
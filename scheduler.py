@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+from db import *
+from generator import SERVICES, one_chunk, generate_service, split_service
+from governor import govern_allocation
+from inflight import complete, forget, issue, outstanding
+from queueing import WORKERS
+
+log = logging.getLogger(__name__)
+
+# Default per-/tasks batch: same 60 x 3 the server always handed out
+BATCH_SIZE = one_chunk * 3
+
+# Base weights per service, 0 disables a generator. Mirrors the weight_* rows in statefull.
+DEFAULT_WEIGHTS = {
+    "bitly": 100,
+    "sid": 100,
+    "shorturl": 100,
+    "tinycc": 0,
+    "shorturlgg": 0,
+}
+WEIGHTS: dict[str, int] = dict(DEFAULT_WEIGHTS)
+ADAPTIVE = False
+
+# Adaptive mode: outcome counters decay so the ratio follows recent results,
+# and every enabled service keeps at least ADAPT_FLOOR of its base share.
+ADAPT_DECAY = 0.999
+ADAPT_FLOOR = 0.05
+OUTCOMES = {service: {"success": 0.0, "noredirect": 0.0, "notfound": 0.0} for service in SERVICES}
+
+
+async def load_schedule():
+    global ADAPTIVE
+    try:
+        stored = await read_service_weights()
+        for service, weight in stored.items():
+            if service in WEIGHTS and weight is not None:
+                WEIGHTS[service] = int(weight)
+        ADAPTIVE = bool(await read_adaptive_schedule())
+    except Exception as e:
+        log.warning("Failed to load weights: %s", e)
+
+async def set_weights(weights: dict):
+    for service, weight in weights.items():
+        if service not in SERVICES:
+            raise ValueError(f"Unknown service: {service}")
+        if int(weight) < 0:
+            raise ValueError(f"Weight for {service} must be >= 0")
+    for service, weight in weights.items():
+        WEIGHTS[service] = int(weight)
+        await update_service_setting("weight", service, int(weight))
+
+async def set_adaptive(condition: bool):
+    global ADAPTIVE
+    ADAPTIVE = bool(condition)
+    await update_adaptive_schedule(ADAPTIVE)
+
+def record_outcome(url, status):
+    service, _ = split_service(url)
+    record_outcomes(service, status)
+
+def record_outcomes(service, status, count=1):
+    """Same as `count` record_outcome calls with one service and status."""
+    counts = OUTCOMES.get(service)
+    if counts is None or status not in counts or count <= 0:
+        return
+    decay = ADAPT_DECAY ** count
+    for key in counts:
+        counts[key] *= decay
+    counts[status] += (1 - decay) / (1 - ADAPT_DECAY) if ADAPT_DECAY < 1 else count
+
+def hit_ratio(service):
+    counts = OUTCOMES[service]
+    total = sum(counts.values())
+    # Laplace smoothing keeps unseen services at 0.5 until they report
+    return (counts["success"] + 1) / (total + 2)
+
+def effective_weights():
+    if not ADAPTIVE:
+        return dict(WEIGHTS)
+    return {
+        service: weight * (ADAPT_FLOOR + hit_ratio(service)) if weight > 0 else 0
+        for service, weight in WEIGHTS.items()
+    }
+
+def allocate_batch(total, weights=None):
+    """
+    Split `total` URLs across services proportionally to their weights
+    (largest remainder, so the parts always sum to `total`).
+    """
+    weights = effective_weights() if weights is None else weights
+    weight_sum = sum(weights.values())
+    if total <= 0 or weight_sum <= 0:
+        return {service: 0 for service in weights}
+
+    shares = {service: total * w / weight_sum for service, w in weights.items()}
+    allocation = {service: int(share) for service, share in shares.items()}
+    leftover = total - sum(allocation.values())
+    by_remainder = sorted(shares, key=lambda s: shares[s] - allocation[s], reverse=True)
+    for service in by_remainder[:leftover]:
+        allocation[service] += 1
+    return allocation
+
+async def generate_batch(total=BATCH_SIZE):
+    # Per-host budgets may shrink the batch below `total`
+    allocation = govern_allocation(allocate_batch(total))
+    services = [service for service, count in allocation.items() if count > 0]
+    batches = await asyncio.gather(*(generate_service(s, allocation[s]) for s in services))
+    return [url for batch in batches for url in batch]
+
+def schedule_snapshot():
+    return {
+        "adaptive": ADAPTIVE,
+        "weights": dict(WEIGHTS),
+        "effective": {s: round(w, 2) for s, w in effective_weights().items()},
+        "hit_ratio": {s: round(hit_ratio(s), 4) for s in SERVICES},
+    }
+
+
+# ---- Worker-aware batch sizing ----
+# Each worker gets roughly BATCH_HORIZON seconds of work at its measured
+# completion rate, minus what it still holds (inflight.py), scaled down when
+# its heartbeat reports CPU/RAM above HEADROOM_KNEE. Unmeasured workers get
+# BATCH_SIZE.
+MIN_BATCH = 10
+MAX_BATCH = 2000
+BATCH_HORIZON = 60
+RATE_WINDOW = 10
+RATE_ALPHA = 0.3
+HEADROOM_KNEE = 80
+
+WORKER_LOAD: dict[str, dict] = {}
+
+
+def _worker_load(worker_id, now):
+    """The worker's entry; None for ids that aren't known workers (/result doesn't authenticate)."""
+    load = WORKER_LOAD.get(worker_id)
+    if load is None:
+        if worker_id not in WORKERS:
+            return None
+        load = WORKER_LOAD[worker_id] = {
+            "rate": None,
+            "done": 0,
+            "window_start": now,
+            "cpu": None,
+            "ram": None,
+        }
+    return load
+
+def record_issued(worker_id, count, now=None, task_ids=()):
+    now = time.monotonic() if now is None else now
+    issue(worker_id, task_ids, count - len(task_ids), now)
+
+def record_completion(worker_id, count=1, now=None, task_id=None):
+    now = time.monotonic() if now is None else now
+    complete(worker_id, task_id, count, now)
+    load = _worker_load(worker_id, now)
+    if load is None:
+        return
+    load["done"] += count
+    elapsed = now - load["window_start"]
+    if elapsed >= RATE_WINDOW:
+        sample = load["done"] / elapsed
+        load["rate"] = sample if load["rate"] is None else RATE_ALPHA * sample + (1 - RATE_ALPHA) * load["rate"]
+        load["done"] = 0
+        load["window_start"] = now
+
+def record_worker_usage(worker_id, cpu, ram, now=None):
+    now = time.monotonic() if now is None else now
+    load = _worker_load(worker_id, now)
+    if load is None:
+        return
+    load["cpu"] = cpu
+    load["ram"] = ram
+
+def forget_worker(worker_id):
+    WORKER_LOAD.pop(worker_id, None)
+    forget(worker_id)
+
+def prune_workers(known):
+    """Forget workers that are gone from `known` (the refreshed worker cache)."""
+    for worker_id in [worker_id for worker_id in WORKER_LOAD if worker_id not in known]:
+        forget_worker(worker_id)
+
+def headroom(load):
+    busiest = max(float(load["cpu"] or 0), float(load["ram"] or 0))
+    if busiest <= HEADROOM_KNEE:
+        return 1.0
+    return max(0.1, (100 - busiest) / (100 - HEADROOM_KNEE))
+
+def batch_size_for(worker_id, now=None):
+    now = time.monotonic() if now is None else now
+    load = _worker_load(worker_id, now)
+    if load is None or load["rate"] is None:
+        size = BATCH_SIZE
+    else:
+        size = load["rate"] * BATCH_HORIZON * headroom(load) - outstanding(worker_id)
+    return int(min(MAX_BATCH, max(MIN_BATCH, size)))
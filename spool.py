@@ -0,0 +1,181 @@
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import uuid
+import zlib
+
+log = logging.getLogger(__name__)
+
+# Append-only write-ahead spool for the result batcher. Every job is written
+# to the current segment before /result acknowledges it; fsyncs are grouped
+# (one per SPOOL_FSYNC_INTERVAL for all concurrent writers). The batcher
+# rotates to a fresh segment each time it drains the queue and deletes the
+# old one once that batch is in Postgres; leftover segments are replayed at
+# startup, so delivery is at-least-once. Each process writes to its own
+# subdirectory and holds an flock on it; only unlocked (dead) directories
+# are replayed. Jobs Postgres rejects outright (bad data, not an outage) are
+# moved to QUARANTINE_FILE instead of being retried.
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")
+SPOOL_FSYNC_INTERVAL = 0.005
+QUARANTINE_FILE = "quarantine.jsonl"  # in SPOOL_DIR, shared by all processes
+
+_FRAME = struct.Struct("<II")  # payload length, crc32
+
+
+def encode_job(job):
+    payload = json.dumps(job, separators=(",", ":")).encode()
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+def read_segment(path):
+    """Yield the jobs of one segment, stopping at a torn or corrupt tail."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset = 0
+            while offset + _FRAME.size <= len(mm):
+                length, crc = _FRAME.unpack_from(mm, offset)
+                start = offset + _FRAME.size
+                payload = mm[start:start + length]
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    log.warning("Truncated record in %s at byte %d, ignoring the rest", path, offset)
+                    return
+                yield json.loads(payload)
+                offset = start + length
+
+
+class Spool:
+    def __init__(self, root=SPOOL_DIR):
+        self.root = root
+        self.directory = None
+        self._lock_fd = None
+        self.fd = None
+        self.path = None
+        self.seq = 0
+        self._dirty: set[int] = set()
+        self._sync_future = None
+        self._inflight = None
+
+    def open(self):
+        name = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        # Locked under a hidden name first: orphaned() in a process starting
+        # at the same moment must never see the directory unlocked
+        staging = os.path.join(self.root, f".{name}")
+        os.makedirs(staging)
+        self._lock_fd = os.open(os.path.join(staging, "lock"), os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.directory = os.path.join(self.root, name)
+        os.rename(staging, self.directory)
+        self._open_next()
+
+    def orphaned(self):
+        """
+        Yield (directory, segment paths) for spools whose process is gone,
+        holding each directory's lock while the caller replays it.
+        """
+        for directory in sorted(glob.glob(os.path.join(self.root, "*"))):
+            if directory == self.directory or not os.path.isdir(directory):
+                continue
+            lock_fd = os.open(os.path.join(directory, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(lock_fd)
+                continue  # a live process owns it
+            try:
+                yield directory, sorted(glob.glob(os.path.join(directory, "*.seg")))
+            finally:
+                os.close(lock_fd)
+
+    def quarantine(self, job, reason):
+        """Set aside a job Postgres will never take, one JSON line per job."""
+        os.makedirs(self.root, exist_ok=True)
+        line = json.dumps({"job": job, "reason": reason}, separators=(",", ":")).encode() + b"\n"
+        fd = os.open(os.path.join(self.root, QUARANTINE_FILE), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def remove_orphan(self, directory):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def _open_next(self):
+        self.seq += 1
+        self.path = os.path.join(self.directory, f"{self.seq:012d}.seg")
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def write(self, job):
+        data = encode_job(job)
+        view = memoryview(data)
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+        self._dirty.add(self.fd)
+
+    async def sync(self):
+        """Wait until everything written so far is on disk."""
+        if self._sync_future is None:
+            self._sync_future = asyncio.get_running_loop().create_future()
+            asyncio.create_task(self._group_fsync(self._sync_future))
+        await asyncio.shield(self._sync_future)
+
+    async def _group_fsync(self, future):
+        await asyncio.sleep(SPOOL_FSYNC_INTERVAL)
+        self._sync_future = None
+        self._inflight = future
+        fds, self._dirty = self._dirty, set()
+        try:
+            for fd in fds:
+                await asyncio.to_thread(os.fsync, fd)
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            self._inflight = None
+
+    def rotate(self):
+        """Start a new segment; returns (path, fd) of the one just closed for writing."""
+        old = (self.path, self.fd)
+        self._open_next()
+        return old
+
+    async def keep(self, segment):
+        """Close a rotated-out segment, leaving it on disk for replay."""
+        path, fd = segment
+        # No group fsync may still hold the fd once it is closed (or reused)
+        if self._inflight is not None:
+            await asyncio.shield(self._inflight)
+        if fd in self._dirty:
+            await self.sync()
+        os.close(fd)
+
+    async def release(self, segment):
+        """Drop a segment whose jobs are safely in the database."""
+        path, fd = segment
+        await self.keep(segment)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Stop writing; an empty directory is removed, anything left is replayed next start."""
+        if self.fd is None:
+            return
+        os.fsync(self.fd)
+        os.close(self.fd)
+        self.fd = None
+        if os.path.getsize(self.path) == 0:
+            os.remove(self.path)
+        if not glob.glob(os.path.join(self.directory, "*.seg")):
+            shutil.rmtree(self.directory, ignore_errors=True)
+        os.close(self._lock_fd)
+        self._lock_fd = None
@@ -12,6 +12,7 @@ const scraped_pages_total = document.getElementById("scraped-pages-total");
 const redirect_failed_percentage = document.getElementById("redirect-failed-percent");
 const redirect_failed_of_total = document.getElementById("redirect-failed-of-total");
 const last_updated = document.getElementById("last-updated");
+const slow_requests = document.getElementById("slow-requests");
 
 
 
@@ -87,40 +88,49 @@ function updateDashboard(data) {
   updateWorkerHoldUI(data.hold_worker);
   updateQueueHoldUI(data.hold_queue);
   updateScrapingRateUI(data.batch_delay);
+  renderSlowRequests(data.slow_requests || []);
 }
 
-function renderWorkers(data) {
-    const container = document.querySelector('.worker-grid');
-    if (!container) return;
-
-    // --- get current filter state ---
-    const activeButton = document.querySelector('.filter-btn.active');
-    const filterStatus = activeButton
-        ? activeButton.textContent.trim().toLowerCase()
-        : "all";
-
-    // --- sort worker nodes by CPU usage (desc) ---
-    const sortedWorkers = [...data.worker_nodes].sort((a, b) => {
-        // if you want status to take priority:
-        // const statusOrder = { active: 1, idle: 0 };
-        // const diff = (statusOrder[b.status] || 0) - (statusOrder[a.status] || 0);
-        // if (diff !== 0) return diff;
+function renderSlowRequests(requests) {
+  slow_requests.innerHTML = '';
+  if (requests.length === 0) {
+    const row = slow_requests.insertRow();
+    const cell = row.insertCell();
+    cell.colSpan = 8;
+    cell.className = 'text-muted text-center';
+    cell.textContent = 'No slow requests';
+    return;
+  }
 
-        return b.cpu_usage - a.cpu_usage;
+  requests.forEach(req => {
+    const row = slow_requests.insertRow();
+    [
+      req.at,
+      `${req.method} ${req.path}`,
+      req.status ?? '-',
+      `${req.total_ms} ms`,
+      `${req.db_ms} ms`,
+      `${req.pool_wait_ms} ms`,
+      req.queries,
+    ].forEach(value => {
+      row.insertCell().textContent = value;
     });
+    const sql = row.insertCell();
+    sql.className = 'text-truncate';
+    sql.style.maxWidth = '420px';
+    sql.title = req.slowest_sql || '';
+    sql.textContent = req.slowest_sql ? `${req.slowest_ms} ms: ${req.slowest_sql}` : '-';
+  });
+}
 
-    // --- clear and render ---
-    container.innerHTML = '';
+function renderWorkers(workers, append) {
+    const container = document.querySelector('.worker-grid');
+    if (!container) return;
 
-    sortedWorkers.forEach(worker => {
-        // --- apply filter ---
-        if (
-            filterStatus !== "all" &&
-            worker.status.toLowerCase() !== filterStatus
-        ) {
-            return; // skip this worker
-        }
+    // --- clear (unless appending the next page) and render in server order ---
+    if (!append) container.innerHTML = '';
 
+    workers.forEach(worker => {
         // Create card container
         const card = document.createElement('div');
         card.className = 'card compact-worker';
@@ -145,6 +155,9 @@ function renderWorkers(data) {
         const info = document.createElement('p');
         info.className = 'text-muted mb-2';
         info.textContent = `${worker.ip} • ${worker.urls_onqueue} URLs • ${worker.disk_name}`;
+        if (worker.latency) {
+            info.textContent += ` • p50 ${worker.latency.p50}s / p95 ${worker.latency.p95}s`;
+        }
 
         // Helper to create progress bars
         function createProgress(labelText, value, colorClass) {
@@ -266,7 +279,7 @@ async function initialLoad() {
     try {
         const data = await sendPostRequest(); // your existing function
         updateDashboard(data);
-        renderWorkers(data);
+        await refreshWorkers();
     } catch (err) {
         console.error('Failed to load dashboard:', err);
     } finally {
@@ -276,7 +289,7 @@ async function initialLoad() {
             try {
                 const data = await sendPostRequest();
                 updateDashboard(data);
-                renderWorkers(data);
+                refreshWorkers();
             } catch (err) {
                 console.error('Failed to update dashboard:', err);
             }
@@ -70,83 +70,104 @@ function showAlert(message, type = "info") {
 }
 window.showAlert = showAlert;
 
-let sortTimeout = null;
-
-
-
-// Sort worker cards by CPU usage (desc)
-function sortWorkerCards() {
-    const container = document.querySelector(".worker-grid");
-    if (!container) return;
-
-    const cards = Array.from(container.querySelectorAll(".card"));
-
-    cards.sort((a, b) => {
-        const cpuA = parseInt(
-            a.querySelector(".progress-cpu .progress-bar")
-                ?.getAttribute("aria-valuenow") || "0"
-        );
-        const cpuB = parseInt(
-            b.querySelector(".progress-cpu .progress-bar")
-                ?.getAttribute("aria-valuenow") || "0"
-        );
-        return cpuB - cpuA;
+// Worker cards are paged from /workers: filter and sort run in SQL, the
+// first page is refreshed on every poll and "Load more" fetches the next
+// page through the keyset cursor.
+const WORKER_PAGE_SIZE = 48;
+const WORKER_PAGE_MAX = 200; // largest page /workers serves, so the most a refresh can keep
+const workerList = {
+    status: "all",
+    sort: "cpu",
+    shown: WORKER_PAGE_SIZE,
+    cursor: null,
+    loading: false,
+};
+
+async function fetchWorkerPage(limit, cursor) {
+    const params = new URLSearchParams({
+        status: workerList.status,
+        sort: workerList.sort,
+        limit: String(limit),
     });
+    if (cursor) params.set("cursor", cursor);
 
-    cards.forEach((card) => container.appendChild(card));
+    const response = await fetch(`/workers?${params}`, { credentials: "include" });
+    if (!response.ok) {
+        throw new Error("Worker list failed with status " + response.status);
+    }
+    return response.json();
 }
 
-// Apply current filter and then sort
-function applyFilterAndSort() {
-    const activeButton = document.querySelector(".filter-btn.active");
-    const status = activeButton
-        ? activeButton.textContent.trim().toLowerCase()
-        : "all";
-
-    const cards = document.querySelectorAll(".worker-grid .card");
-    cards.forEach((card) => {
-        const badge = card.querySelector(".badge");
-        const cardStatus = badge.textContent.trim().toLowerCase();
-        card.style.display =
-            status === "all" || cardStatus === status ? "block" : "none";
-    });
+function updateWorkerPager(page) {
+    const more = document.getElementById("load-more-workers");
+    const count = document.getElementById("worker-count");
+    const shown = document.querySelectorAll(".worker-grid .card").length;
+    if (more) more.classList.toggle("d-none", !page.next_cursor || workerList.shown >= WORKER_PAGE_MAX);
+    if (count) {
+        const total = workerList.status === "all" ? page.counts.total : page.counts[workerList.status];
+        count.textContent = `${shown} of ${total} workers`;
+    }
+}
 
-    sortWorkerCards();
+// Re-fetch everything currently shown (first page after a filter change)
+async function refreshWorkers() {
+    if (workerList.loading) return;
+    workerList.loading = true;
+    try {
+        const limit = Math.min(Math.max(workerList.shown, WORKER_PAGE_SIZE), WORKER_PAGE_MAX);
+        const page = await fetchWorkerPage(limit, null);
+        renderWorkers(page.worker_nodes, false);
+        workerList.cursor = page.next_cursor;
+        updateWorkerPager(page);
+    } catch (err) {
+        console.error("Failed to load workers:", err);
+    } finally {
+        workerList.loading = false;
+    }
+}
+window.refreshWorkers = refreshWorkers;
+
+async function loadMoreWorkers() {
+    const room = WORKER_PAGE_MAX - workerList.shown;
+    if (workerList.loading || !workerList.cursor || room <= 0) return;
+    workerList.loading = true;
+    try {
+        const page = await fetchWorkerPage(Math.min(WORKER_PAGE_SIZE, room), workerList.cursor);
+        renderWorkers(page.worker_nodes, true);
+        workerList.cursor = page.next_cursor;
+        workerList.shown += page.worker_nodes.length;
+        updateWorkerPager(page);
+    } catch (err) {
+        console.error("Failed to load more workers:", err);
+    } finally {
+        workerList.loading = false;
+    }
 }
 
-// Initialize filtering & sorting system
 function initWorkerCardSystem() {
-    applyFilterAndSort();
-
-    // Filter button functionality
     const filterButtons = document.querySelectorAll(".filter-btn");
     filterButtons.forEach((button) => {
         button.addEventListener("click", function () {
             filterButtons.forEach((btn) => btn.classList.remove("active"));
             this.classList.add("active");
 
-            applyFilterAndSort();
+            workerList.status = this.textContent.trim().toLowerCase();
+            workerList.shown = WORKER_PAGE_SIZE;
+            refreshWorkers();
         });
     });
 
-    // Watch for DOM changes (cards added/removed or CPU updated)
-    const container = document.querySelector(".worker-grid");
-    if (!container) return;
-
-    const observer = new MutationObserver(() => {
-        // Debounce to avoid infinite loop
-        clearTimeout(sortTimeout);
-        sortTimeout = setTimeout(() => {
-            applyFilterAndSort();
-        }, 200);
-    });
+    const sortSelect = document.getElementById("worker-sort");
+    if (sortSelect) {
+        sortSelect.addEventListener("change", () => {
+            workerList.sort = sortSelect.value;
+            workerList.shown = WORKER_PAGE_SIZE;
+            refreshWorkers();
+        });
+    }
 
-    observer.observe(container, {
-        childList: true,
-        subtree: true,
-        attributes: true,
-        attributeFilter: ["aria-valuenow", "class"], // catch CPU + status changes
-    });
+    const more = document.getElementById("load-more-workers");
+    if (more) more.addEventListener("click", loadMoreWorkers);
 }
 
 // Run once DOM is ready
@@ -6,6 +6,8 @@
 -- Try generating sample data and querying it by running the example statements below, or click
 -- New Query to clear the editor.
 -- */
+-- Safe to run again on an existing database: tables and indexes are only
+-- created when missing, seed rows only inserted when missing
 CREATE TABLE IF NOT EXISTS workers (
     worker_id TEXT PRIMARY KEY,                       -- unique worker identifier (UUID)
     api_key TEXT UNIQUE NOT NULL,                     -- unique API key per worker
@@ -43,14 +45,17 @@ CREATE TABLE IF NOT EXISTS scraped_pages (
 
 CREATE TABLE IF NOT EXISTS lastcount (
     service TEXT PRIMARY KEY,
-    last_index INTEGER NOT NULL DEFAULT 0
+    last_index BIGINT NOT NULL DEFAULT 0
 );
 
-INSERT INTO lastcount (service, last_index) VALUES ('bitly', 0);
-INSERT INTO lastcount (service, last_index) VALUES ('shorturl', 0);
-INSERT INTO lastcount (service, last_index) VALUES ('sid', 0);
-INSERT INTO lastcount (service, last_index) VALUES ('tinycc', 0);
-INSERT INTO lastcount (service, last_index) VALUES ('shorturlgg', 0);
+-- Databases created before last_index was widened; a no-op otherwise
+ALTER TABLE lastcount ALTER COLUMN last_index TYPE BIGINT;
+
+INSERT INTO lastcount (service, last_index) VALUES ('bitly', 0) ON CONFLICT DO NOTHING;
+INSERT INTO lastcount (service, last_index) VALUES ('shorturl', 0) ON CONFLICT DO NOTHING;
+INSERT INTO lastcount (service, last_index) VALUES ('sid', 0) ON CONFLICT DO NOTHING;
+INSERT INTO lastcount (service, last_index) VALUES ('tinycc', 0) ON CONFLICT DO NOTHING;
+INSERT INTO lastcount (service, last_index) VALUES ('shorturlgg', 0) ON CONFLICT DO NOTHING;
 
 CREATE TABLE IF NOT EXISTS statistics (
     stat_type TEXT PRIMARY KEY,
@@ -70,7 +75,8 @@ INSERT INTO statistics (stat_type, percentage, count, change_value) VALUES
 ('url_not_found', 0, 0, NULL),
 ('total_url', NULL, 0, NULL),
 ('scraped_pages', NULL, 0, 0),
-('redirect_failed', 0, 0, NULL);
+('redirect_failed', 0, 0, NULL)
+ON CONFLICT DO NOTHING;
 
 CREATE TABLE IF NOT EXISTS task_queue (
     task_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
@@ -87,15 +93,29 @@ CREATE TABLE IF NOT EXISTS scraper_admin (
     key3 TEXT
 );
 
+-- Session checks look admins up by key1
+CREATE INDEX IF NOT EXISTS scraper_admin_key1 ON scraper_admin (key1);
+
 CREATE TABLE IF NOT EXISTS statefull (
     state_type TEXT PRIMARY KEY,
     state BOOL,
     value INTEGER
 );
 
-INSERT INTO statefull (state_type, state, value) VALUES ('worker_hold', false, NULL);
-INSERT INTO statefull (state_type, state, value) VALUES ('queue_hold', false, NULL);
-INSERT INTO statefull (state_type, state, value) VALUES ('delay', false, 0);
+INSERT INTO statefull (state_type, state, value) VALUES ('worker_hold', false, NULL) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('queue_hold', false, NULL) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('delay', false, 0) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('adaptive_schedule', false, NULL) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('weight_bitly', true, 100) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('weight_sid', true, 100) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('weight_shorturl', true, 100) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('weight_tinycc', true, 0) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('weight_shorturlgg', true, 0) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('rate_bitly', true, 100) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('rate_sid', true, 100) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('rate_shorturl', true, 100) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('rate_tinycc', true, 100) ON CONFLICT DO NOTHING;
+INSERT INTO statefull (state_type, state, value) VALUES ('rate_shorturlgg', true, 100) ON CONFLICT DO NOTHING;
 
 CREATE TABLE IF NOT EXISTS big_queue (
     task_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
@@ -103,3 +123,29 @@ CREATE TABLE IF NOT EXISTS big_queue (
     unresolved_url TEXT,
     assigned_at TIMESTAMP NULL
 );
+
+-- The stale-worker reaper looks up a dead worker's tasks by worker_id
+CREATE INDEX IF NOT EXISTS big_queue_worker_id ON big_queue (worker_id);
+-- ... and /tasks claims the rows it released from this one
+CREATE INDEX IF NOT EXISTS big_queue_released ON big_queue (task_id)
+    WHERE worker_id IS NULL AND assigned_at = '-infinity';
+
+-- Range mode: a worker enumerates codes start_index .. start_index + count - 1
+-- itself and reports progress as a watermark (codes done from start_index)
+CREATE TABLE IF NOT EXISTS range_leases (
+    lease_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    service TEXT NOT NULL,
+    start_index BIGINT NOT NULL,
+    count INTEGER NOT NULL,
+    watermark INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT NULL,
+    assigned_at TIMESTAMP NULL
+);
+
+CREATE INDEX IF NOT EXISTS range_leases_assigned_at ON range_leases (assigned_at);
+CREATE INDEX IF NOT EXISTS range_leases_worker_id ON range_leases (worker_id);
+
+CREATE TABLE IF NOT EXISTS server_nodes (
+    node_id TEXT PRIMARY KEY,                                   -- hostname-pid-suffix of a server process
+    last_seen TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
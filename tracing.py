@@ -0,0 +1,129 @@
+import contextvars
+import os
+import random
+import time
+from collections import deque
+
+# Per-request database tracing. A sampled request carries a RequestTrace in a
+# context variable; db.py adds every statement (and pool wait) to it, the
+# middleware reports the totals in a Server-Timing header, and requests
+# slower than TRACE_SLOW_MS (not counting long-poll parking) go into a ring
+# buffer shown on the dashboard.
+# Unsampled requests and background tasks see None and pay one lookup per
+# statement.
+TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", "1"))  # 0 disables tracing
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "250"))
+TRACE_RING = int(os.getenv("TRACE_RING", "100"))
+
+SLOW_REQUESTS: deque = deque(maxlen=TRACE_RING)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    __slots__ = ("queries", "db_ms", "pool_wait_ms", "parked_ms", "slowest_ms", "slowest_sql")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.pool_wait_ms = 0.0
+        self.parked_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = None
+
+    def add_query(self, sql, elapsed_ms, statements=1):
+        self.queries += statements
+        self.db_ms += elapsed_ms
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_sql = sql
+
+    def server_timing(self, total_ms):
+        parts = [
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f"dbwait;dur={self.pool_wait_ms:.1f}",
+        ]
+        if self.slowest_sql is not None:
+            # Durations only; the statement itself stays on the dashboard
+            parts.append(f"dbslow;dur={self.slowest_ms:.1f}")
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+def current_trace():
+    return _current.get()
+
+def _statement_text(query):
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    elif not isinstance(query, str):
+        query = repr(query)  # psycopg.sql.Composed
+    return " ".join(query.split())
+
+def record_query(query, elapsed_ms, statements=1):
+    trace = _current.get()
+    if trace is not None:
+        trace.add_query(_statement_text(query), elapsed_ms, statements)
+
+def record_pool_wait(elapsed_ms):
+    trace = _current.get()
+    if trace is not None:
+        trace.pool_wait_ms += elapsed_ms
+
+def record_parked(elapsed_ms):
+    trace = _current.get()
+    if trace is not None:
+        trace.parked_ms += elapsed_ms
+
+def slow_requests():
+    """Most recent slow requests first."""
+    return list(reversed(SLOW_REQUESTS))
+
+
+class TraceMiddleware:
+    """ASGI middleware; plain ASGI so unsampled requests skip all wrapping."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or TRACE_SAMPLE <= 0 or (
+            TRACE_SAMPLE < 1 and random.random() >= TRACE_SAMPLE
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current.set(trace)
+        started = time.perf_counter()
+        status = None
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - started) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing(total_ms).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            total_ms = (time.perf_counter() - started) * 1000
+            if total_ms - trace.parked_ms >= TRACE_SLOW_MS:
+                SLOW_REQUESTS.append({
+                    "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "method": scope.get("method"),
+                    "path": scope.get("path"),
+                    "status": status,
+                    "total_ms": round(total_ms, 1),
+                    "db_ms": round(trace.db_ms, 1),
+                    "pool_wait_ms": round(trace.pool_wait_ms, 1),
+                    "parked_ms": round(trace.parked_ms, 1),
+                    "queries": trace.queries,
+                    "slowest_ms": round(trace.slowest_ms, 1),
+                    "slowest_sql": trace.slowest_sql,
+                })
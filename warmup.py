@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import os
+import time
+from db import db_read_cursors, pool_stats, read_control_flags
+from generator import SERVICES, materialize
+from governor import load_rate_limits
+from queueing import WORKERS, load_workers
+from scheduler import load_schedule
+
+log = logging.getLogger(__name__)
+
+# Startup warm-up and readiness. Before the process reports ready on /healthz
+# (and before uvicorn takes its first request) the pools hold min_size
+# connections and the per-process caches a /tasks call reads are filled:
+# worker credentials, control flags and each generator's suffix table. The
+# control flags (queue_hold, worker_hold, delay) are then served from memory,
+# reloaded on every /actions change (here or, over NOTIFY, elsewhere) and
+# every CONTROL_REFRESH seconds, together with the schedule (weights, adaptive
+# mode) and the per-service rate limits, so a missed NOTIFY costs at most one
+# refresh interval.
+CONTROL_REFRESH = float(os.getenv("CONTROL_REFRESH", "5"))
+CONTROL = {"worker_hold": None, "queue_hold": None, "delay": None}
+
+_state = {"ready": False, "warmup_ms": None}
+
+
+async def load_control_flags():
+    CONTROL.update(await read_control_flags())
+
+async def control_refresher():
+    while True:
+        await asyncio.sleep(CONTROL_REFRESH)
+        await load_schedule()
+        await load_rate_limits()
+        try:
+            await load_control_flags()
+        except Exception as e:
+            log.warning("Control flag refresh failed: %s", e)
+
+async def warm_up():
+    started = time.perf_counter()
+    await asyncio.gather(load_control_flags(), load_workers())
+
+    cursors = await db_read_cursors()
+    for service in SERVICES:
+        if service not in cursors:
+            log.warning("No lastcount cursor for %s; it will generate nothing", service)
+            continue
+        materialize(service, cursors[service], 1)  # builds the suffix table
+
+    _state["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    log.info(
+        "Warm-up done in %sms (%d workers cached)", _state["warmup_ms"], len(WORKERS),
+        extra={"warmup_ms": _state["warmup_ms"], "workers": len(WORKERS)},
+    )
+
+def mark_ready():
+    _state["ready"] = True
+
+def is_ready():
+    return _state["ready"]
+
+def health():
+    return {
+        "ready": _state["ready"],
+        "warmup_ms": _state["warmup_ms"],
+        "workers_cached": len(WORKERS),
+        "pools": {name: {"size": s["size"], "idle": s["idle"], "waiting": s["waiting"]} for name, s in pool_stats().items()},
+    }